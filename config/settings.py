@@ -146,3 +146,12 @@ os.environ.setdefault('DEBUG_PRINTS', '0')  # Default to disabled
 # os.environ.setdefault('DEBUG_PRINTS', 'test')
 
 AUTHENTICATION_BACKENDS = ["core.models.flexup_auth_backend.FlexUpAuthBackend"]
+
+# Exchange rates
+# External API used to fetch the currency rates to the Euro (see core.utils.fetch_exchange_rate)
+EXCHANGE_RATE_API_URL = os.environ.get('EXCHANGE_RATE_API_URL', 'https://api.frankfurter.app/latest')
+EXCHANGE_RATE_API_TIMEOUT = 10  # seconds
+EXCHANGE_RATE_BULK_THRESHOLD = 10  # when more currencies than this are stale, all the rates are refreshed in one API call
+
+# Audit log
+AUDIT_LOG_ASYNC = False  # when True, log_changes queues the log entries, and a background thread writes them in batches (see core.utils.audit_queue)
@@ -0,0 +1,62 @@
+# ------- core/benchmarks/show_differences_time.py
+""" Time of the word diff of show_differences on 10,000 words descriptions, compared with difflib.SequenceMatcher on the whole word lists
+
+Usage (from the project root):
+    python -m core.benchmarks.show_differences_time [--runs 5] [--words 10000]
+"""
+from core.utils.show_differences import _diff_words, show_differences_separate
+import argparse
+import difflib
+import random
+import statistics
+import time
+
+
+def make_scenarios(word_count: int) -> dict:
+    """ Return the (text1, text2) pairs to compare, by scenario name """
+    rng = random.Random(0)
+    vocabulary = [f"word{index}" for index in range(2000)]
+    words = [rng.choice(vocabulary) for _ in range(word_count)]
+
+    one_word = list(words)
+    one_word[word_count // 2] = "changed"
+    paragraph = words[:word_count // 3] + [rng.choice(vocabulary) for _ in range(100)] + words[word_count // 3:]
+    scattered = list(words)
+    for index in rng.sample(range(word_count), 50):
+        scattered[index] = "changed"
+    rewritten = words[:word_count // 4] + [rng.choice(vocabulary) for _ in range(word_count // 2)] + words[-word_count // 4:]
+
+    text = ' '.join(words)
+    return {
+        'one word changed': (text, ' '.join(one_word)),
+        'paragraph inserted': (text, ' '.join(paragraph)),
+        '50 scattered changes': (text, ' '.join(scattered)),
+        'half rewritten': (text, ' '.join(rewritten)),
+    }
+
+
+def measure(function, runs: int) -> float:
+    """ Return the median duration (in seconds) of function() """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="number of runs per scenario (default: 5)")
+    parser.add_argument('--words', type=int, default=10000, help="number of words of the descriptions (default: 10000)")
+    args = parser.parse_args()
+
+    for name, (text1, text2) in make_scenarios(args.words).items():
+        whole = measure(lambda: difflib.SequenceMatcher(None, text1.split(), text2.split()).get_opcodes(), args.runs)
+        fast = measure(lambda: _diff_words(text1, text2), args.runs)
+        total = measure(lambda: show_differences_separate(text1, text2), args.runs)
+        print(f"{name:<24} whole lists {whole * 1000:9.2f} ms   fast path {fast * 1000:8.2f} ms ({fast / whole:6.1%})   show_differences_separate {total * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -176,4 +176,10 @@ class Currency(FlexUpEnum):
     YER   =  'YER',  _('Yemeni rial'),                    _('rial'),       '﷼',      '﷼YE',          '',                  '886',  'True',     '',          ''
     JPY   =  'JPY',  _('Yen'),                            _('yen'),        '¥',      '¥JP',          '',                  '392',  'True',     '',          ''
     ZMW   =  'ZMW',  _('Zambian Kwacha'),                 _('kwacha'),     'K',      'ZK',           '',                  '967',  'True',     '',          ''
-    ZWL   =  'ZWL',  _('Zimbabwe Dollar'),                _('dollar'),     'Z$',     'Z$',           '',                  '932',  'True',     '',          ''
\ No newline at end of file
+    ZWL   =  'ZWL',  _('Zimbabwe Dollar'),                _('dollar'),     'Z$',     'Z$',           '',                  '932',  'True',     '',          ''
+
+    @property
+    def countries(self) -> tuple:
+        """ The countries using this currency (see Country.currencies) """
+        from .country import Country  # imported on use: Country is declared with the currencies
+        return Country.get_reverse_index('currencies').get(self, ())
@@ -191,4 +191,10 @@ class Language(FlexUpEnum):
     YID     =  'YID',  _('Yiddish'),                   'YI'
     YOR     =  'YOR',  _('Yoruba'),                    'YO'
     ZHA     =  'ZHA',  _('Zhuang'),                    'ZA'
-    ZUL     =  'ZUL',  _('Zulu'),                      'ZU'
\ No newline at end of file
+    ZUL     =  'ZUL',  _('Zulu'),                      'ZU'
+
+    @property
+    def countries(self) -> tuple:
+        """ The countries where this language is spoken (see Country.languages) """
+        from .country import Country  # imported on use: Country is declared with the languages
+        return Country.get_reverse_index('languages').get(self, ())
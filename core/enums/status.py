@@ -42,7 +42,7 @@ class Status(FlexUpEnum):
     TERMINATED        =  'TM',   _('Terminated'),        '✖️',     'secondary',  _('contract has been terminated')
 
     def __str__(self):
-        return str(self.label)
+        return self.translated('label')
     
 StatusShortList = Status.allowed_choices(Status.PENDING, Status.ACTIVE, Status.CLOSED, Status.SUSPENDED)
 
@@ -69,7 +69,7 @@ class Action(FlexUpEnum):
     TERMINATE  =  "TR",     _("Terminate")                                                      
 
     def __str__(self):
-        return str(self.label)  # Ensure this returns a string
+        return self.translated('label')  # Ensure this returns a string
 
 
 class ActionType(FlexUpEnum):
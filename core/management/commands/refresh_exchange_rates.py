@@ -0,0 +1,10 @@
+from core.utils.refresh_exchange_rates import refresh_exchange_rates
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Fetch the rates of all the active currencies in one API call, and store them with a single bulk insert"
+
+    def handle(self, *args, **options):
+        refreshed_rates = refresh_exchange_rates()
+        self.stdout.write(self.style.SUCCESS(f"{len(refreshed_rates)} exchange rates refreshed"))
@@ -1,24 +1,32 @@
-
-
-from account.models.account import Account, Member
+# from account.models.account import Account, Member  # account app not included in this repo
 from core.enums.currency import Currency
-from core.enums.general import Focus, Visibility
-from core.enums.status import Status
 from core.models.flexup_enum_field import FlexUpEnumField
-from core.models.flexup_model import FlexUpModel, get_current_member
-from decimal import Decimal as Dec, ROUND_HALF_UP
-from django.core.exceptions import ValidationError
+from decimal import Decimal as Dec
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from product.enums import ProductStatuses, SystemUnit, ProductVisibilities
-from typing import Optional
-from dataclasses import fields
 
 
 class ExchangeRate(models.Model):
+    """ Rate of a currency to the Euro, as fetched from the external API
+      - Attributes:
+          - currency (Currency): the currency of the rate
+          - rate (Decimal): value of 1 unit of the currency in EUR (eg: 1 USD = 0.85 EUR)
+          - datetime (datetime): date and time when the rate was fetched
+    """
+    class Meta:
+        verbose_name = _("Exchange rate")
+        verbose_name_plural = _("Exchange rates")
+        indexes = [
+            models.Index(fields=['currency', '-datetime']),
+        ]
+
+# Required input fields
     currency: Currency = FlexUpEnumField(flexup_enum=Currency, verbose_name=_("Currency"), choices=Currency.choices)
     rate: Dec = models.DecimalField(verbose_name=_("Rate"), max_digits=15, decimal_places=6)
+
+# Calculated input fields
     datetime = models.DateTimeField(verbose_name=_("Date"), auto_now_add=True)
-    
-  
-  
\ No newline at end of file
+
+# Labels
+    def __str__(self):
+        return f"1 {self.currency} = {self.rate} EUR ({self.datetime:%Y-%m-%d %H:%M})"
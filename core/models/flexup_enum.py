@@ -1,9 +1,40 @@
 # -------- core/models/flexup_enum.py
+from decimal import Decimal
 from enum_properties import EnumProperties
-from django.utils.translation import gettext_lazy as _
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.autoreload import file_changed
+from django.utils.functional import Promise
+from django.utils.translation import get_language, gettext_lazy as _
+from weakref import WeakKeyDictionary
 
 from utils.print_object import _print_object
 
+# Lookup indexes, built lazily per enum class on first use (weak keys, so that enums declared in tests can be garbage collected)
+# Only values of these types are looked up in the hashed indexes & sets: their hash is consistent with ==. Other values are compared one by one,
+# eg: items of another enum, which are equal to their value but hashed by name, or lazy translations, whose text (and hash) changes with the language
+_INDEXABLE_TYPES = (str, int, float, bool, Decimal, type(None))
+_value_indexes = WeakKeyDictionary()     # enum class → {value: enum item}
+_property_indexes = WeakKeyDictionary()  # enum class → {property name: {property value: [(value, label), ...]}, or None if not indexable}
+_valid_values = WeakKeyDictionary()      # enum class → {(short_list key, property name, property value): (short_list if tuple, valid values)}, see is_valid
+_VALID_VALUES_CACHE_SIZE = 256           # maximum number of memoized sets per enum class
+_ordinals = WeakKeyDictionary()          # enum class → {item name: position in the declaration order}, see sort_key
+_choices = WeakKeyDictionary()           # enum class → {(method name, arguments): tuple of (value, label)}, see choices
+_translations = WeakKeyDictionary()      # enum class → {(language, property name, item name): resolved value}, see translated
+_reverse_indexes = WeakKeyDictionary()   # enum class → {property name: {element: tuple of items}}, see get_reverse_index
+
+
+@receiver(setting_changed)
+def _clear_translations_on_setting_change(setting, **kwargs):
+    if setting in ('LANGUAGES', 'LANGUAGE_CODE', 'LOCALE_PATHS', 'USE_I18N'):
+        _translations.clear()
+
+
+@receiver(file_changed)
+def _clear_translations_on_file_change(file_path, **kwargs):
+    if file_path.suffix == '.mo':  # translations reloaded by the development server (returns None: the reload decision is left to Django)
+        _translations.clear()
+
 class ClassPropertyDescriptor:
     """A descriptor that enables defining class properties in the class body.
 
@@ -62,6 +93,7 @@ class FlexUpEnum(EnumProperties):
     def is_valid(cls, input_value, short_list=None, property_name=None, property_value=None):
         """
         Check if the given input_value is valid for this enum. Optionally filtered by a property (optionally with a value to match) and/or a short_list.
+        The sets of valid values are memoized per (short_list, property_name, property_value), so a check is usually one set lookup.
 
         Args:
             - input_value = The value to check (value or enum instance).
@@ -81,47 +113,98 @@ class FlexUpEnum(EnumProperties):
         if property_value and not property_name:
             raise ValueError("property_value cannot be provided without property_name")
 
-        # Extract the raw value if input_value is an enum instance
-        if isinstance(input_value, cls):
-            value = input_value.value
-        else:
-            value = input_value
+        return cls._is_in(input_value, cls._get_valid_values(short_list, property_name, property_value))
 
+    @classmethod
+    def are_valid(cls, input_values, short_list=None, property_name=None, property_value=None):
+        """
+        Bulk version of is_valid (eg: for imports): the set of valid values is resolved once for all the input values.
+        - Args:
+            - input_values: The values to check (values or enum instances).
+            - short_list, property_name, property_value: see is_valid
+        - Returns:
+            - list of bool, in the same order as input_values
+        """
+        if property_value and not property_name:
+            raise ValueError("property_value cannot be provided without property_name")
 
-        if short_list:
-            # Handle both enum instances and (value, label) tuples in short_list
-            valid_values_shl = []
-            for item in short_list:
-                if isinstance(item, cls):
-                    valid_values_shl.append(item.value)
-                elif isinstance(item, tuple):
-                    valid_values_shl.append(item[0])  # Get the value from the tuple
+        valid_values = cls._get_valid_values(short_list, property_name, property_value)
+        return [input_value is not None and cls._is_in(input_value, valid_values) for input_value in input_values]
 
+    @classmethod
+    def _is_in(cls, input_value, valid_values):
+        """ Return True if the value of input_value (value or enum instance) is in valid_values (frozenset or tuple, see _get_valid_values) """
+        value = input_value.value if isinstance(input_value, cls) else input_value
+        if type(value) in _INDEXABLE_TYPES or isinstance(valid_values, tuple):
+            return value in valid_values
+        return any(value == valid_value for valid_value in valid_values)  # see _INDEXABLE_TYPES
+
+    @classmethod
+    def _get_valid_values(cls, short_list=None, property_name=None, property_value=None):
+        """
+        Return the valid values for is_valid, memoized when possible
+        - The memoization key includes the identity of short_list if it is a tuple, or its values if it is a list.
+          Property filters on values which cannot be indexed (eg: lazy translations, which change with the language) are not memoized.
+        - Returns:
+            - frozenset of values, or a tuple if some values cannot be hashed consistently with ==
+        """
+        pinned_short_list = short_list if short_list and isinstance(short_list, tuple) else None
+        if pinned_short_list is not None:
+            short_list_key = id(short_list)
+        elif short_list:
+            short_list_key = tuple(cls._get_short_list_values(short_list))
+        else:
+            short_list_key = None
+
+        key = None
+        if not property_value or (type(property_value) in _INDEXABLE_TYPES and cls._get_property_index(property_name) is not None):
+            key = (pinned_short_list is not None, short_list_key, property_name, property_value)
+            try:
+                entry = _valid_values.get(cls, {}).get(key)
+            except TypeError:  # unhashable short_list values
+                key, entry = None, None
+            if entry is not None and entry[0] is pinned_short_list:
+                return entry[1]
+
+        if short_list:
+            valid_values = cls._get_short_list_values(short_list)
+        else:
+            valid_values = [item.value for item in cls]
         if property_name:
             if property_value:
-                valid_values_prop = [item.value for item in cls if getattr(item, property_name) == property_value]
+                property_values = [item.value for item in cls if getattr(item, property_name) == property_value]
             else:
-                valid_values_prop = [item.value for item in cls if getattr(item, property_name, None) is not None]
-        else:
-            valid_values = [item.value for item in cls]
+                property_values = [item.value for item in cls if getattr(item, property_name, None) is not None]
+            valid_values = [value for value in valid_values if value in property_values] if short_list else property_values
 
-        # return true if value is in both lists, if applicable
-        if short_list and property_name:
-            return value in valid_values_shl and value in valid_values_prop
-        elif short_list:
-            # print("short_list: ", short_list)
-            # print("value: ", value)
-            # print("valid_values_shl: ", valid_values_shl)
-            return value in valid_values_shl
-        elif property_name:
-            return value in valid_values_prop
+        if all(type(value) in _INDEXABLE_TYPES for value in valid_values):
+            valid_values = frozenset(valid_values)
         else:
-            return value in valid_values
+            valid_values = tuple(valid_values)
+
+        if key is not None:
+            cache = _valid_values.get(cls)
+            if cache is None or len(cache) >= _VALID_VALUES_CACHE_SIZE:  # eg: many transient short_list tuples
+                cache = _valid_values[cls] = {}
+            cache[key] = (pinned_short_list, valid_values)  # the tuple is kept alive, so that its id cannot be reused while the entry exists
+        return valid_values
+
+    @classmethod
+    def _get_short_list_values(cls, short_list):
+        """ Return the values of a short_list: enum instances and (value, label) tuples, other items are ignored """
+        values = []
+        for item in short_list:
+            if isinstance(item, cls):
+                values.append(item.value)
+            elif isinstance(item, tuple):
+                values.append(item[0])  # Get the value from the tuple
+        return values
 
     # @classmethod
     @classproperty
     def choices(cls):
-        return [(item.value, item.label) for item in cls]
+        """ Return the (value, label) tuples of all the items, as a tuple cached per enum class """
+        return cls._get_choices(('choices',), lambda item: True)
 
     @classmethod
     def allowed_choices(cls, *allowed_values):
@@ -130,9 +213,9 @@ class FlexUpEnum(EnumProperties):
         - Args:
             - allowed_values = List of enum instances values to be included in the choices
         - Returns:
-            - list of tuples = representing the allowed choices provided
+            - tuple of tuples = representing the allowed choices provided (cached per allowed_values)
         """
-        return [(item.value, item.label) for item in cls if item.name in allowed_values]
+        return cls._get_choices(('allowed_choices', allowed_values), lambda item: item.name in allowed_values)
 
     @classmethod
     def filter_choices(cls, property_name):
@@ -141,32 +224,129 @@ class FlexUpEnum(EnumProperties):
         - Args:
             - property_name: The name of the property to filter by.
         - Returns:
-            - list of tuples representing the enums for the allowed choices provided
+            - tuple of tuples representing the enums for the allowed choices provided (cached per property_name)
         """
-        return [(item.value, item.label) for item in cls if getattr(item, property_name, None) is not None]
+        return cls._get_choices(('filter_choices', property_name), lambda item: getattr(item, property_name, None) is not None)
+
+    @classmethod
+    def _get_choices(cls, key, include):
+        """ Return the (value, label) tuples of the items for which include(item) is True, cached per enum class and key (unless the key is unhashable) """
+        cache = _choices.get(cls)
+        if cache is None:
+            cache = _choices[cls] = {}
+        try:
+            choices = cache.get(key)
+        except TypeError:
+            return tuple((item.value, item.label) for item in cls if include(item))
+        if choices is None:
+            choices = cache[key] = tuple((item.value, item.label) for item in cls if include(item))
+        return choices
+
+    @classmethod
+    def clear_caches(cls):
+        """ Clear the lookup indexes, memoized valid values, ordinals, choices and translations of this enum class (eg: in tests which modify an enum) """
+        for cache in (_value_indexes, _property_indexes, _valid_values, _ordinals, _choices, _translations, _reverse_indexes):
+            cache.pop(cls, None)
 
     @classmethod
     def find_by_property(cls, property_name, value):
         """
         Return the list of all enum (tuples) items where the given property has the given value.
+        - Uses a reverse index of the property, built on first use, unless the property or the value cannot be indexed (eg: lazy translations)
         - Args:
             - property_name: The name of the property to filter by.
             - value: The value to filter by.
         - Returns:
             - A list of tuples representing the enums where the property has the given value.
         """
-        return [(item.value, item.label) for item in cls if getattr(item, property_name) == value]
+        index = cls._get_property_index(property_name)
+        if index is None or type(value) not in _INDEXABLE_TYPES:
+            return [(item.value, item.label) for item in cls if getattr(item, property_name) == value]
+        return list(index.get(value, ()))
 
     @classmethod
     def get_by_value(cls, value):
         """
         Returns the enum (tuple) item with the given value.
+        - Uses an index of the values, built on first use
         - Args:
             - value: The value to filter by.
         - Returns:
             - A list of tuples representing the enums with the given value, or None if not found.
         """
-        return next((item for item in cls if item.value == value), None)
+        if isinstance(value, cls):
+            return value
+        if type(value) not in _INDEXABLE_TYPES:  # see _INDEXABLE_TYPES
+            return next((item for item in cls if item.value == value), None)
+
+        index = _value_indexes.get(cls)
+        if index is None:
+            index = {}
+            for item in cls:
+                index.setdefault(item.value, item)
+            _value_indexes[cls] = index
+        return index.get(value)
+
+    @classmethod
+    def get_reverse_index(cls, property_name):
+        """
+        Return the reverse index of a property holding lists (eg: Country.currencies), built once per process.
+        - Args:
+            - property_name: The name of the property, whose values are lists of elements (eg: Currency items).
+        - Returns:
+            - dict of element → tuple of the enum items whose property contains the element, in declaration order
+        """
+        indexes = _reverse_indexes.get(cls)
+        if indexes is None:
+            indexes = _reverse_indexes[cls] = {}
+        index = indexes.get(property_name)
+        if index is None:
+            lists = {}
+            for item in cls:
+                for element in getattr(item, property_name) or ():
+                    items = lists.setdefault(element, [])
+                    if item not in items:
+                        items.append(item)
+            index = indexes[property_name] = {element: tuple(items) for element, items in lists.items()}
+        return index
+
+    @classmethod
+    def _get_property_index(cls, property_name):
+        """ Return the reverse index {property value: [(value, label), ...]} of a property, or None if its values cannot be indexed """
+        indexes = _property_indexes.get(cls)
+        if indexes is None:
+            indexes = _property_indexes[cls] = {}
+        if property_name not in indexes:
+            index = {}
+            for item in cls:
+                property_value = getattr(item, property_name)
+                if type(property_value) not in _INDEXABLE_TYPES:
+                    index = None
+                    break
+                index.setdefault(property_value, []).append((item.value, item.label))
+            indexes[property_name] = index
+        return indexes[property_name]
+
+    def translated(self, property_name='label'):
+        """ Return a property of the item (default: label) resolved in the active language, eg: for __str__ methods rendering many rows
+        - The lazy translations are resolved once per language, then cached until the translation settings or files change.
+        - Args:
+            - property_name: The name of the property (eg: 'label', 'symbol', 'description').
+        - Returns:
+            - str for the translated properties, the property value as is otherwise
+        """
+        translations = _translations.get(self.__class__)
+        if translations is None:
+            translations = _translations[self.__class__] = {}
+        key = (get_language(), property_name, self.name)
+        try:
+            return translations[key]
+        except KeyError:
+            value = getattr(self, property_name)
+            if isinstance(value, Promise):
+                value = str(value)
+            translations[key] = value
+            return value
 
     def __str__(self):
         return self.value
@@ -174,18 +354,33 @@ class FlexUpEnum(EnumProperties):
     def __len__(self):
         return len(self.value)
 
+    def sort_key(self) -> int:
+        """ Return the position of the item in the declaration order of its enum (eg: sorted(statuses, key=Status.sort_key)) """
+        ordinals = _ordinals.get(self.__class__)
+        if ordinals is None:
+            ordinals = _ordinals[self.__class__] = {name: index for index, name in enumerate(self.__class__._member_names_)}
+        return ordinals[self.name]
+
     # the comparison is based on the order of the items in the list
     def __lt__(self, other):
         if self.__class__ is other.__class__:
-            # Get the indices from _member_names_ list
-            # print("same class")
-            self_idx = self.__class__._member_names_.index(self.name)
-            other_idx = self.__class__._member_names_.index(other.name)
-            # print(self_idx, ": ", self.name)
-            # print(other_idx, ": ", other.name)
-            # print(self_idx < other_idx)
-            return self_idx < other_idx
+            return self.sort_key() < other.sort_key()
         return self.value < other.value
+
+    def __le__(self, other):
+        if self.__class__ is other.__class__:
+            return self.sort_key() <= other.sort_key()
+        return self.value <= other.value
+
+    def __gt__(self, other):
+        if self.__class__ is other.__class__:
+            return self.sort_key() > other.sort_key()
+        return self.value > other.value
+
+    def __ge__(self, other):
+        if self.__class__ is other.__class__:
+            return self.sort_key() >= other.sort_key()
+        return self.value >= other.value
     
     # # use this version if the the comparison is based on name of the items, but this is redundant with the get_first_item utility function
     # def __lt__(self, other):
@@ -1,14 +1,32 @@
 #  --------- core/models/flexup_enum_field.py
+from functools import cached_property
 from typing import Any
+from django.core import checks
 from django.db import models
 from django.forms import ValidationError
 
 
 class FlexUpEnumField(models.CharField):
+    """ Model field storing a FlexUpEnum instance
+    - By default, the enum value is stored as a string (eg: 'EUR').
+    - With ordinals, each instance is stored as a small integer (SmallIntegerField), to reduce the size of the rows and indexes:
+        - ordinals maps each enum value to its integer. It must be explicit: the declaration order of the enums (eg: alphabetical for Currency)
+          changes when an item is added, which would silently decode the existing rows to other items.
+        - the mapping is written in the migrations (see deconstruct), so any change of an existing integer is visible in makemigrations.
+          Values of removed items can be kept in ordinals, so that their integers are not reused.
+        - integer_storage=True without ordinals is reported by the system checks (core.E004).
+    """
     description = "A FlexUpEnum field"
 
-    def __init__(self, flexup_enum, *args, **kwargs):
+    def __init__(self, flexup_enum, *args, integer_storage=False, ordinals=None, **kwargs):
         self.flexup_enum = flexup_enum
+        self.integer_storage = integer_storage or ordinals is not None
+        if ordinals is not None:
+            self.ordinals = dict(ordinals)
+        elif self.integer_storage:
+            self.ordinals = {}  # reported by _check_ordinals
+        else:
+            self.ordinals = None
         max_length = max(len(str(item.value)) for item in flexup_enum)
         if 'max_length' in kwargs:
             kwargs.pop('max_length', None)
@@ -18,16 +36,52 @@ class FlexUpEnumField(models.CharField):
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
         kwargs['flexup_enum'] = self.flexup_enum
+        if self.integer_storage:
+            kwargs['integer_storage'] = True
+            kwargs['ordinals'] = self.ordinals
 
         return name, path, args, kwargs
 
-    def from_db_value(self, value, expression, connection):
-        if value is not None:
-            for choice in self.flexup_enum:
-                if choice.value == value:
-                    return choice
+    def check(self, **kwargs):
+        return [*super().check(**kwargs), *self._check_ordinals()]
+
+    def _check_ordinals(self):
+        if not self.integer_storage:
+            return []
+        if not self.ordinals:
+            return [checks.Error("integer_storage requires explicit ordinals, eg: ordinals={'EUR': 1, 'USD': 2}", obj=self, id='core.E004')]
+        errors = []
+        missing_values = [item.value for item in self.flexup_enum if item.value not in self.ordinals]
+        if missing_values:
+            errors.append(checks.Error(f"ordinals must map every value of {self.flexup_enum.__name__}, missing: {missing_values}", obj=self, id='core.E001'))
+        if len(set(self.ordinals.values())) != len(self.ordinals):
+            errors.append(checks.Error("ordinals must map each value to a different integer", obj=self, id='core.E002'))
+        if any(not isinstance(ordinal, int) or not -32768 <= ordinal <= 32767 for ordinal in self.ordinals.values()):
+            errors.append(checks.Error("ordinals must be small integers (-32768 to 32767)", obj=self, id='core.E003'))
+        return errors
+
+    def get_internal_type(self):
+        if self.integer_storage:
+            return 'SmallIntegerField'
+        return super().get_internal_type()
+
+    @cached_property
+    def members_by_value(self) -> dict:
+        """ Map of the enum values to the enum instances, built on first use, to decode the database values with a single lookup """
+        return {choice.value: choice for choice in self.flexup_enum}
+
+    @cached_property
+    def members_by_ordinal(self) -> dict:
+        """ Map of the stored integers to the enum instances, for integer_storage """
+        members_by_value = self.members_by_value
+        return {ordinal: members_by_value[value] for value, ordinal in self.ordinals.items() if value in members_by_value}
 
-        return None
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, self.flexup_enum):
+            return value
+        if self.integer_storage:
+            return self.members_by_ordinal.get(value)
+        return self.members_by_value.get(value)
 
 
 #     def to_python(self, value): # Origina version
@@ -41,28 +95,38 @@ class FlexUpEnumField(models.CharField):
 #         return None
 
     def to_python(self, value):
-        if isinstance(value, self.flexup_enum):
-            return value
         if value is None:
             return None
-        enum_value = self.flexup_enum.get_by_value(value)
+        enum_value = self.get_member(value)
         if enum_value is not None:
             return enum_value
-        raise ValidationError(f"Invalid value '{value}' for field {self.name}. Must be one of {[item.value for item in self.flexup_enum]}")
+        raise ValidationError(f"Invalid value '{value}' for field {self.name}. Must be one of {self.allowed_values}")
 
 
     def get_prep_value(self, value):
         if value is None:
             return None
-        # If it's already an enum instance
-        if isinstance(value, self.flexup_enum):
-            return value.value
-
-        # If it's a string, try to find matching enum
-        enum_value = self.flexup_enum.get_by_value(value)
+        enum_value = self.get_member(value)
         if enum_value is not None:
-            return enum_value.value
+            return self.ordinals[enum_value.value] if self.integer_storage else enum_value.value
+
+        raise ValueError(f"Invalid value '{value}' for field {self.name}. Must be one of {self.allowed_values}")
 
-        raise ValueError(f"Invalid value '{value}' for field {self.name}. Must be one of {[item.value for item in self.flexup_enum]}")
+        # return str(value)
 
-        # return str(value)
\ No newline at end of file
+    def get_member(self, value):
+        """ Return the enum instance matching an enum instance or a value, or None if there is none (shared by to_python and get_prep_value) """
+        if isinstance(value, self.flexup_enum):
+            return value
+        try:
+            enum_value = self.members_by_value.get(value)
+        except TypeError:  # unhashable value
+            enum_value = None
+        if enum_value is None and not isinstance(value, str):
+            enum_value = self.flexup_enum.get_by_value(value)  # compared one by one (see flexup_enum._INDEXABLE_TYPES)
+        return enum_value
+
+    @cached_property
+    def allowed_values(self) -> str:
+        """ The list of the enum values, formatted once per field for the error messages """
+        return str([item.value for item in self.flexup_enum])
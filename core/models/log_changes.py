@@ -1,18 +1,50 @@
 from django.utils import timezone
-from django.db import models
+from django.conf import settings
+from django.db import connections, models, router, transaction
+from core.utils.audit_queue import AuditQueue
 from core.utils.show_differences import show_differences_separate
 from django.utils.translation import gettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+import logging
 
+logger = logging.getLogger(__name__)  # each logged change is also sent at DEBUG level, which is off unless enabled in the LOGGING setting
 
-def log_changes(instance, dummy_member, old_values, new_values):
-    """A function to log changes to an object"""
+
+def log_changes(instance, dummy_member, old_values, new_values, asynchronous=None):
+    """A function to log changes to an object
+    - The entry and its lines are written in a single transaction: one INSERT for the entry and one bulk INSERT for all the lines
+    - In asynchronous mode, they are queued when the current transaction is committed (at once if none), and written in batches by a background thread (see audit_queue), so the caller does not wait for the inserts
+    - Args:
+        - asynchronous (bool, optional): write the entry in the background (default: the AUDIT_LOG_ASYNC setting)
+    - Returns:
+        - LogEntry: the new log entry (not saved yet in asynchronous mode)
+    """
     content_type = ContentType.objects.get_for_model(instance)
-    log_entry = LogEntry.objects.create(
-        dummy_member=dummy_member, content_type=content_type, object_id=instance.pk
-    )
+    log_entry, log_entry_lines = build_log_entry(content_type, instance.pk, dummy_member, old_values, new_values)
+
+    if asynchronous is None:
+        asynchronous = settings.AUDIT_LOG_ASYNC
+    if asynchronous:  # queued only once the changes are committed, so that no entry is written for changes rolled back
+        using = router.db_for_write(instance.__class__, instance=instance)
+        transaction.on_commit(lambda: audit_queue.put((log_entry, log_entry_lines), using=using), using=using)
+    else:
+        write_log_entries([(log_entry, log_entry_lines)], using=router.db_for_write(instance.__class__, instance=instance))
+    return log_entry
 
+
+def build_log_entry(content_type, object_id, dummy_member, old_values, new_values) -> tuple:
+    """ Build, without saving them, the log entry of an object and a line for each changed field
+    - Args:
+        - content_type (ContentType): the content type of the object
+        - object_id (int): the id of the object
+        - dummy_member: the member who made the changes
+        - old_values, new_values (dict): field name → value before / after the changes
+    - Returns:
+        - tuple: (LogEntry, list of LogEntryLine), to be written with write_log_entries
+    """
+    log_entry = LogEntry(dummy_member=dummy_member, content_type=content_type, object_id=object_id)
+    log_entry_lines = []
     for field, old_value in old_values.items():
         new_value = new_values.get(field)
         if old_value != new_value:
@@ -21,13 +53,43 @@ def log_changes(instance, dummy_member, old_values, new_values):
                 old_diff, new_diff = show_differences_separate(old_value, new_value)
                 old_value = old_diff
                 new_value = new_diff
-            log_line = LogEntryLine.objects.create(
-                log_entry=log_entry,
+            log_entry_lines.append(LogEntryLine(
                 field_name=field,
                 old_value=old_value,
                 new_value=new_value,
-            )
-            print(log_line)
+            ))
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for log_line in log_entry_lines:
+            logger.debug("%s: %s → %s", log_line.field_name, log_line.old_value, log_line.new_value, extra={'model': content_type.model, 'object_id': object_id, 'field_name': log_line.field_name})
+    return log_entry, log_entry_lines
+
+
+def write_log_entries(records, using=None):
+    """ Write log entries and their lines in a single transaction, with one bulk INSERT for the entries and one for all the lines
+    - The lines need the ids of their entries: on databases which do not return the ids of bulk inserted rows (eg: MySQL), the entries are inserted one by one
+    - Args:
+        - records (list): (LogEntry, list of LogEntryLine) tuples, not saved yet
+        - using (str, optional): the database alias (default: the database for writing log entries)
+    """
+    using = using or router.db_for_write(LogEntry)
+    log_entries = [log_entry for log_entry, log_entry_lines in records]
+    with transaction.atomic(using=using):
+        if connections[using].features.can_return_rows_from_bulk_insert:
+            LogEntry.objects.using(using).bulk_create(log_entries)
+        else:
+            for log_entry in log_entries:
+                log_entry.save(using=using)
+        all_lines = []
+        for log_entry, log_entry_lines in records:
+            for log_line in log_entry_lines:
+                log_line.log_entry = log_entry
+            all_lines.extend(log_entry_lines)
+        if all_lines:
+            LogEntryLine.objects.using(using).bulk_create(all_lines)
+
+
+audit_queue = AuditQueue(write_log_entries)  # log entries waiting to be written in the background (asynchronous mode)
 
 
 class LogEntry(models.Model):
@@ -68,7 +130,188 @@ class LogEntryLine(models.Model):
         return f"{self.field_name}: {self.old_value[:50] + '...' if self.old_value and len(self.old_value) > 50 else self.new_value} → {self.new_value[:50] + '...' if self.new_value and len(self.new_value) > 50 else self.new_value}"
 
 
-class DummyModel(models.Model):
+class ChangeTrackingMixin:
+    """ Mixin for the models whose changes are logged with log_changes, without reading the row again before each save
+    - Description:
+        - the values loaded from the database are kept as a snapshot (see from_db), and compared in memory with the current values on save
+        - only the changed fields are passed to log_changes, and only their columns are updated (update_fields)
+        - a field deferred at load time (eg: with only()) and then set is saved and logged, with None as old value (its database value was never read)
+        - a save without any change still saves the instance (signals, auto_now fields), without logging anything
+        - new instances, and instances not loaded from the database, are saved normally and not logged; the snapshot is taken after the save
+        - to be placed before the model class in the bases, eg: class Product(ChangeTrackingMixin, AbstractProduct) for FlexUpModel subclasses
+    - Methods:
+        - get_changed_fields, get_change_member
+    """
+    _loaded_values = None  # attname → value loaded from (or last saved to) the database, None if not loaded from the database
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {field_name: value for field_name, value in zip(field_names, values) if value is not models.DEFERRED}
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None:
+            self._take_snapshot()
+        elif self._loaded_values is not None:  # only the refreshed fields hold their database values, the other fields may have unsaved changes
+            fields = set(fields)
+            self._take_snapshot([field for field in self._meta.concrete_fields if field.name in fields or field.attname in fields])
+
+    def get_changed_fields(self) -> dict:
+        """ Return the fields changed since the instance was loaded or last saved, compared in memory (no database query)
+        - Returns:
+            - dict: field → (old value, new value), empty if nothing changed or if the instance was not loaded from the database
+        """
+        if self._loaded_values is None:
+            return {}
+        changed_fields = {}
+        for field in self._meta.concrete_fields:
+            if field.attname in self._loaded_values:
+                old_value = self._loaded_values[field.attname]
+                new_value = getattr(self, field.attname)
+                if old_value != new_value:
+                    changed_fields[field] = (old_value, new_value)
+            elif field.attname in self.__dict__:  # deferred at load time, and set since then
+                changed_fields[field] = (None, self.__dict__[field.attname])
+        return changed_fields
+
+    def get_change_member(self):
+        """ Return the member to record in the log entries (default: the modified_by attribute, if any) """
+        return getattr(self, "modified_by", None)
+
+    def save(self, dummy_member=None, *args, **kwargs):
+        """ Save the instance, and log its changes (see log_changes)
+        - Args:
+            - dummy_member: the member recorded in the log entry (default: see get_change_member)
+            - other args: see Model.save
+        """
+        if self._state.adding or self._loaded_values is None or kwargs.get('force_insert'):
+            super().save(*args, **kwargs)
+            self._take_snapshot()
+            return
+
+        changed_fields = self.get_changed_fields()
+        saved_fields = None  # all the loaded fields
+        if kwargs.get('update_fields') is not None:
+            update_fields = set(kwargs['update_fields'])
+            saved_fields = [field for field in self._meta.concrete_fields if field.name in update_fields or field.attname in update_fields]
+            changed_fields = {field: values for field, values in changed_fields.items() if field in saved_fields}
+        elif changed_fields:
+            # auto_now fields (eg: updated_datetime) are set by the save itself, so they are not part of the changes
+            saved_fields = list(changed_fields) + [field for field in self._meta.concrete_fields if getattr(field, 'auto_now', False) and field not in changed_fields]
+            kwargs['update_fields'] = [field.name for field in saved_fields]
+
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            if changed_fields:
+                old_values = {field.name: values[0] for field, values in changed_fields.items()}
+                new_values = {field.name: values[1] for field, values in changed_fields.items()}
+                log_changes(self, dummy_member if dummy_member is not None else self.get_change_member(), old_values, new_values)
+        self._take_snapshot(saved_fields)
+
+    def _take_snapshot(self, fields=None):
+        """ Store the current values of the fields provided (default: all the loaded fields) as the reference for the next save """
+        if fields is None:
+            deferred_fields = self.get_deferred_fields()
+            self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields if field.attname not in deferred_fields}
+        else:
+            self._loaded_values.update({field.attname: getattr(self, field.attname) for field in fields})
+
+
+class AuditedQuerySetMixin:
+    """ QuerySet mixin adding bulk updates which log their changes, as save does with ChangeTrackingMixin, without a query per row
+    - Description:
+        - the old values of the updated rows are read in a single query (one per batch of ids, on databases limiting the number of query parameters)
+        - the log entries and their lines are written with two bulk INSERTs, then the update is applied, all in a single transaction
+        - only the rows and fields actually changed get a log entry / line
+    - Methods:
+        - audited_update, audited_bulk_update
+    """
+
+    def audited_update(self, dummy_member=None, **kwargs) -> int:
+        """ Same as update(**kwargs), logging the changes of each row
+        - The values may be expressions (eg: F('price_excluding_tax') * 2): the new values are then read after the update, with one more query
+        - Args:
+            - dummy_member: the member recorded in the log entries
+            - kwargs: field name → new value, as for update
+        - Returns:
+            - int: the number of rows updated
+        """
+        fields = [self.model._meta.get_field(field_name) for field_name in kwargs]
+        has_expressions = any(hasattr(value, 'resolve_expression') for value in kwargs.values())
+        with transaction.atomic(using=self.db):
+            old_rows = self._get_field_values(self.select_for_update(), fields)
+            if has_expressions:
+                count = self._update_rows(list(old_rows), kwargs)
+                new_rows = self._get_field_values_by_pk(list(old_rows), fields)
+                write_log_entries(self._build_log_entries(old_rows, new_rows, dummy_member), using=self.db)
+            else:
+                new_values = {field.name: self._to_python(field, value) for field, value in zip(fields, kwargs.values())}
+                write_log_entries(self._build_log_entries(old_rows, {pk: new_values for pk in old_rows}, dummy_member), using=self.db)
+                count = self._update_rows(list(old_rows), kwargs)
+        return count
+
+    def audited_bulk_update(self, objs, fields, batch_size=None, dummy_member=None) -> int:
+        """ Same as bulk_update(objs, fields, batch_size), logging the changes of each object
+        - Args:
+            - dummy_member: the member recorded in the log entries
+            - other args: see bulk_update
+        - Returns:
+            - int: the number of rows updated
+        """
+        objs = list(objs)
+        model_fields = [self.model._meta.get_field(field_name) for field_name in fields]
+        with transaction.atomic(using=self.db):
+            old_rows = self._get_field_values_by_pk([obj.pk for obj in objs], model_fields)
+            new_rows = {obj.pk: {field.name: getattr(obj, field.attname) for field in model_fields} for obj in objs}
+            write_log_entries(self._build_log_entries(old_rows, new_rows, dummy_member), using=self.db)
+            return self.bulk_update(objs, fields, batch_size=batch_size)
+
+    def _get_field_values(self, queryset, fields) -> dict:
+        """ Return the values of the fields in the database for the rows of the queryset, in one query
+        - Returns:
+            - dict: id → {field name → value}
+        """
+        return {pk: {field.name: value for field, value in zip(fields, values)} for pk, *values in queryset.values_list('pk', *[field.attname for field in fields])}
+
+    def _get_field_values_by_pk(self, pks, fields) -> dict:
+        """ Same as _get_field_values for the rows with the ids provided, in one query per batch of ids allowed by the database (a single one on PostgreSQL) """
+        rows = {}
+        for batch in self._batch_pks(pks):
+            rows.update(self._get_field_values(self.model._base_manager.using(self.db).filter(pk__in=batch), fields))
+        return rows
+
+    def _update_rows(self, pks, values) -> int:
+        """ Update the rows with the ids provided, in one query per batch of ids allowed by the database, and return the number of rows updated """
+        return sum(self.model._base_manager.using(self.db).filter(pk__in=batch).update(**values) for batch in self._batch_pks(pks))
+
+    def _batch_pks(self, pks):
+        """ Yield the ids in batches small enough for the database query parameters limit """
+        batch_size = connections[self.db].ops.bulk_batch_size(['pk'], pks) or 1
+        for start in range(0, len(pks), batch_size):
+            yield pks[start:start + batch_size]
+
+    @staticmethod
+    def _to_python(field, value):
+        """ Return a value as read from the database (eg: a related object as its id), to be compared with the old value """
+        if field.is_relation:
+            return getattr(value, 'pk', value)
+        return field.to_python(value)
+
+    def _build_log_entries(self, old_rows, new_rows, dummy_member) -> list:
+        """ Return the (LogEntry, lines) of the rows with at least one changed field (see build_log_entry) """
+        content_type = ContentType.objects.get_for_model(self.model)
+        records = []
+        for pk, old_values in old_rows.items():
+            log_entry, log_entry_lines = build_log_entry(content_type, pk, dummy_member, old_values, new_rows.get(pk, old_values))
+            if log_entry_lines:
+                records.append((log_entry, log_entry_lines))
+        return records
+
+
+class DummyModel(ChangeTrackingMixin, models.Model):
     """A dummy model for testing log changes"""
 
     name = models.CharField(
@@ -84,24 +327,6 @@ class DummyModel(models.Model):
     def __str__(self):
         return self.name
 
-    def save(self, dummy_member="dummy_member", *args, **kwargs):
-        if self.pk:
-            old_instance = DummyModel.objects.get(pk=self.pk)
-            old_values = {}
-            new_values = {}
-            for field in self._meta.fields:
-                field_name = field.name
-                old_value = getattr(old_instance, field_name)
-                new_value = getattr(self, field_name)
-                old_values[field_name] = old_value
-                new_values[field_name] = new_value
-            # Assuming 'modified_by' is a field storing the member
-            dummy_member = getattr(self, "modified_by", None)
-            log_changes(self, dummy_member, old_values, new_values)
-            super().save(*args, **kwargs)
-        else:
-            super().save(*args, **kwargs)
-
 
 # This is old code
 # class Log(models.Model):
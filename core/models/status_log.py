@@ -36,8 +36,8 @@ class StatusLog(FlexUpModel):
     def __str__(self):
         by_label = self.created_by_member.account if self.created_by_member and self.created_by_member.account else 'System'
         # _print_object(self.new_status, label="StatusLog.__str__ : self.new_status")
-        new_status = f"{self.new_status.label} {self.new_status.symbol} " if self.new_status else '(no new status)'
-        return f"{self.action_datetime.date()}: {self.action.label}, {self.initial_status.label} {self.initial_status.symbol} -> {new_status}, by {by_label}"
+        new_status = f"{self.new_status.translated('label')} {self.new_status.translated('symbol')} " if self.new_status else '(no new status)'
+        return f"{self.action_datetime.date()}: {self.action.translated('label')}, {self.initial_status.translated('label')} {self.initial_status.translated('symbol')} -> {new_status}, by {by_label}"
 
     def clean(self):
         if not self.created_by_member and not self.action_by_system:
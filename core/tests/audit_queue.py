@@ -0,0 +1,139 @@
+from core.utils.audit_queue import AuditQueue
+from django.test import SimpleTestCase
+from unittest import mock
+import threading
+
+
+class TestAuditQueue(SimpleTestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.written = threading.Event()
+
+    def write_batch(self, batch, using=None):
+        self.batches.append(list(batch))
+        self.written.set()
+
+    def test_01_batch_written_when_full(self):
+        # Given a queue writing batches of 3 records, at most every 60 seconds
+        audit_queue = AuditQueue(self.write_batch, batch_size=3, flush_interval=60)
+
+        # When 3 records are added
+        with mock.patch('core.utils.audit_queue.close_old_connections') as close_old_connections:
+            for record in range(3):
+                audit_queue.put(record)
+            self.assertTrue(self.written.wait(5))
+            audit_queue.flush()
+
+        # Then they are written at once by the worker, without waiting for the interval, and its old database connections are released
+        self.assertEqual(self.batches, [[0, 1, 2]])
+        self.assertEqual(audit_queue.pending(), 0)
+        close_old_connections.assert_called()
+
+    def test_02_batch_written_after_the_interval(self):
+        # Given a queue writing batches of 100 records, at most every 50 ms
+        audit_queue = AuditQueue(self.write_batch, batch_size=100, flush_interval=0.05)
+
+        # When 2 records are added
+        audit_queue.put('a')
+        audit_queue.put('b')
+
+        # Then they are written once the interval is over
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [['a', 'b']])
+
+    def test_03_flush(self):
+        # Given a queue with 5 pending records, and an interval long enough for them to still be waiting
+        audit_queue = AuditQueue(self.write_batch, batch_size=2, flush_interval=60)
+        audit_queue._start = lambda: None  # no worker: the records stay in the queue until flushed
+        for record in range(5):
+            audit_queue.put(record)
+        self.assertEqual(audit_queue.pending(), 5)
+
+        # When the queue is flushed
+        audit_queue.flush()
+
+        # Then all the records are written, in batches of at most 2 records
+        self.assertEqual(self.batches, [[0, 1], [2, 3], [4]])
+        self.assertEqual(audit_queue.pending(), 0)
+
+    def test_04_back_pressure(self):
+        # Given a full queue, without worker
+        audit_queue = AuditQueue(self.write_batch, max_size=2, put_timeout=0.01)
+        audit_queue._start = lambda: None
+        audit_queue.put(1)
+        audit_queue.put(2)
+
+        # When another record is added
+        with self.assertLogs('core.utils.audit_queue', level='WARNING'):
+            audit_queue.put(3)
+
+        # Then it is written synchronously, after waiting for put_timeout
+        self.assertEqual(self.batches, [[3]])
+        self.assertEqual(audit_queue.pending(), 2)
+
+    def test_05_write_errors(self):
+        # Given a queue whose writes fail
+        def write_batch(batch, using=None):
+            raise RuntimeError("database unavailable")
+        audit_queue = AuditQueue(write_batch, retries=2, retry_delay=0)
+        audit_queue._start = lambda: None
+        audit_queue.put(1)
+
+        # When it is flushed, then the error is logged once retried, and flush returns
+        with self.assertLogs('core.utils.audit_queue', level='WARNING') as logs:
+            audit_queue.flush()
+        self.assertEqual([record.levelname for record in logs.records], ['WARNING', 'WARNING', 'WARNING', 'ERROR'])
+        self.assertEqual(audit_queue.pending(), 0)
+
+    def test_06_write_retried(self):
+        # Given a queue whose first write fails (eg: database restarting)
+        def write_batch(batch, using=None):
+            if not self.batches:
+                self.batches.append(None)
+                raise RuntimeError("database unavailable")
+            self.write_batch(batch)
+        audit_queue = AuditQueue(write_batch, retries=2, retry_delay=0)
+        audit_queue._start = lambda: None
+        audit_queue.put(1)
+        audit_queue.put(2)
+
+        # When it is flushed
+        with self.assertLogs('core.utils.audit_queue', level='WARNING'):
+            audit_queue.flush()
+
+        # Then the batch is written by the retry, instead of being lost
+        self.assertEqual(self.batches, [None, [1, 2]])
+
+    def test_07_invalid_record(self):
+        # Given a queue with a record which can never be written, between two valid records
+        def write_batch(batch, using=None):
+            if 'invalid' in batch:
+                raise ValueError("invalid record")
+            self.write_batch(batch)
+        audit_queue = AuditQueue(write_batch, retries=1, retry_delay=0)
+        audit_queue._start = lambda: None
+        for record in ('a', 'invalid', 'b'):
+            audit_queue.put(record)
+
+        # When it is flushed
+        with self.assertLogs('core.utils.audit_queue', level='ERROR') as logs:
+            audit_queue.flush()
+
+        # Then the valid records are written one by one, and only the invalid one is logged as not written
+        self.assertEqual(self.batches, [['a'], ['b']])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("'invalid'", logs.output[0])
+
+    def test_08_database_kept(self):
+        # Given records queued for two databases
+        written = []
+        audit_queue = AuditQueue(lambda batch, using=None: written.append((using, list(batch))))
+        audit_queue._start = lambda: None
+        audit_queue.put(1, using='default')
+        audit_queue.put(2, using='audit')
+        audit_queue.put(3, using='default')
+
+        # When they are written, then each database gets its own records
+        audit_queue.flush()
+        self.assertEqual(written, [('default', [1, 3]), ('audit', [2])])
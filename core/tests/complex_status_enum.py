@@ -83,12 +83,12 @@ class DummyStatusTestCase(SimpleTestCase):
         self.assertEqual(CSE.NEW.label, Status.NEW.label)
         self.assertEqual(CSE.NEW.symbol, Status.NEW.symbol)
         self.assertEqual(len(CSE.choices), 7)
-        self.assertEqual(CSE.choices, [('NW', 'New'), ('DR', 'Draft'), ('PE', 'Pending'), ('RJ', 'Rejected'), ('RT', 'Retracted'), ('SI', 'Signed'), ('CF', 'Confirmed')])
+        self.assertEqual(CSE.choices, (('NW', 'New'), ('DR', 'Draft'), ('PE', 'Pending'), ('RJ', 'Rejected'), ('RT', 'Retracted'), ('SI', 'Signed'), ('CF', 'Confirmed')))
         self.assertEqual(CSE.choices[0], ('NW', 'New'))
         self.assertEqual(CSE.is_valid("NW"), True)
         self.assertEqual(CSE.is_valid(CSE.NEW), True)
-        self.assertEqual(DummyStatusShortList, [('NW', 'New'),  ('DR', 'Draft')])
-        self.assertEqual(CSE.filter_choices("priority"), [('NW', 'New'), ('SI', 'Signed'), ('CF', 'Confirmed')])
+        self.assertEqual(DummyStatusShortList, (('NW', 'New'),  ('DR', 'Draft')))
+        self.assertEqual(CSE.filter_choices("priority"), (('NW', 'New'), ('SI', 'Signed'), ('CF', 'Confirmed')))
         self.assertEqual(CSE.find_by_property("priority", 9), [('SI', 'Signed')])
         self.assertEqual(CSE.get_by_value("SI"), CSE.SIGNED)
         
@@ -0,0 +1,21 @@
+from core.enums.country import Country
+from core.enums.currency import Currency
+from core.enums.language import Language
+from django.test import SimpleTestCase
+from utils.print_object import _print_object
+
+
+class TestCountryReverseIndexes(SimpleTestCase):
+
+    def test_01_currency_countries(self):
+        _print_object(print_function_name=True)
+        # The countries using a currency are those listing it in their currencies, in declaration order
+        self.assertEqual(Currency.EUR.countries, tuple(country for country in Country if Currency.EUR in country.currencies))
+        self.assertIn(Country.FR, Currency.EUR.countries)
+        self.assertIn(Country.ZW, Currency.USD.countries)  # secondary currency
+        self.assertIs(Currency.EUR.countries, Currency.EUR.countries)  # built once
+
+    def test_02_language_countries(self):
+        _print_object(print_function_name=True)
+        self.assertEqual(Language.FRE.countries, tuple(country for country in Country if Language.FRE in country.languages))
+        self.assertIn(Country.BE, Language.FRE.countries)
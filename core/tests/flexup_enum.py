@@ -43,16 +43,16 @@ class TestFlexUpEnum(TestCase):
 
     def test_choices(self):
         """Test the choices class property."""
-        expected_choices = [
+        expected_choices = (
             self.tuple_one,
             self.tuple_two,
             self.tuple_three
-        ]
+        )
         self.assertEqual(MK.choices, expected_choices)
 
     def test_allowed_choices(self):
         """Test the allowed_choices method."""
-        expected_choices = [self.tuple_one, self.tuple_two]
+        expected_choices = (self.tuple_one, self.tuple_two)
         self.assertEqual(
             MK.allowed_choices(MK.ONE, MK.TWO),
             expected_choices
@@ -60,7 +60,7 @@ class TestFlexUpEnum(TestCase):
 
     def test_filter_choices(self):
         """Test filtering choices by property."""
-        expected_choices = [self.tuple_one, self.tuple_two]
+        expected_choices = (self.tuple_one, self.tuple_two)
         self.assertEqual(MK.filter_choices("level"), expected_choices)
 
     def test_find_by_property(self):
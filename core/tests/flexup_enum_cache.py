@@ -0,0 +1,128 @@
+from django.test import TestCase, override_settings
+from django.utils import translation
+from core.enums.status import Status
+from core.models.flexup_enum import FlexUpEnum, _translations
+
+
+class MockEnum(FlexUpEnum):
+    label: str
+    symbol: str
+    level: int
+
+    # name =  value,  label,    symbol,   level
+    ONE =     "O",    "One",    "😅",    1
+    TWO =     "T",    "Two",    "⭐",    2
+    THREE =   "H",    "Three",  "🍀",    None
+
+MK = MockEnum
+
+ShortList1 = MockEnum.allowed_choices(MK.ONE, MK.TWO)
+
+
+class TestFlexUpEnumCache(TestCase):
+    """Test suite for the cached lookups of FlexUpEnum (choices, indexes, valid values, ordinals and translations)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up data for all test methods."""
+        cls.tuple_one = (MK.ONE.value, MK.ONE.label)
+        cls.tuple_two = (MK.TWO.value, MK.TWO.label)
+        cls.tuple_three = (MK.THREE.value, MK.THREE.label)
+
+    def test_choices_cached(self):
+        """Test that the choices are built once, as immutable tuples."""
+        self.assertIs(MK.choices, MK.choices)
+        self.assertIsInstance(MK.choices, tuple)
+        self.assertIs(MK.allowed_choices(MK.ONE, MK.TWO), MK.allowed_choices(MK.ONE, MK.TWO))
+        self.assertEqual(MK.allowed_choices(MK.THREE), (self.tuple_three,))
+        self.assertIs(MK.filter_choices("level"), MK.filter_choices("level"))
+
+    def test_clear_caches(self):
+        """Test that clear_caches rebuilds the cached choices."""
+        choices = MK.choices
+        MK.clear_caches()
+        self.assertIsNot(MK.choices, choices)
+        self.assertEqual(MK.choices, choices)
+
+    def test_find_by_property_index(self):
+        """Test that find_by_property gives the same results with and without the property index."""
+        self.assertEqual(MK.find_by_property("level", 1), [self.tuple_one])
+        self.assertEqual(MK.find_by_property("level", None), [self.tuple_three])
+        self.assertEqual(MK.find_by_property("level", 4), [])
+        self.assertEqual(MK.find_by_property("label", "Two"), [self.tuple_two])  # not indexed
+        self.assertEqual(MK.find_by_property("symbol", ["⭐"]), [])              # unhashable value
+
+        # The returned lists are copies of the index
+        MK.find_by_property("level", 2).clear()
+        self.assertEqual(MK.find_by_property("level", 2), [self.tuple_two])
+
+        with self.assertRaises(AttributeError):
+            MK.find_by_property("color", "red")
+
+    def test_get_by_value(self):
+        """Test getting enum instances by value."""
+        self.assertIs(MK.get_by_value("O"), MK.ONE)
+        self.assertIs(MK.get_by_value(MK.TWO), MK.TWO)
+        self.assertIsNone(MK.get_by_value("X"))
+        self.assertIsNone(MK.get_by_value(None))
+        self.assertIsNone(MK.get_by_value(["O"]))
+        self.assertIs(Status.get_by_value(Status.NEW.value), Status.NEW)
+
+    def test_ordering(self):
+        """Test that the items are ordered by declaration order, not by value."""
+        self.assertTrue(MK.TWO < MK.THREE)  # 'T' > 'H', but TWO is declared before THREE
+        self.assertTrue(MK.THREE > MK.ONE)
+        self.assertTrue(MK.ONE <= MK.ONE)
+        self.assertFalse(MK.TWO >= MK.THREE)
+        self.assertEqual(sorted([MK.THREE, MK.ONE, MK.TWO]), [MK.ONE, MK.TWO, MK.THREE])
+        self.assertEqual(sorted(['H', 'O'], key=lambda value: MK.get_by_value(value).sort_key()), ['O', 'H'])
+        self.assertEqual([item.sort_key() for item in MK], [0, 1, 2])
+
+    def test_is_valid_memoized(self):
+        """Test that the memoized sets of valid values follow the short_list and property filters."""
+        self.assertIs(MK._get_valid_values(ShortList1, 'level'), MK._get_valid_values(ShortList1, 'level'))
+        self.assertEqual(MK._get_valid_values(ShortList1, 'level'), frozenset({'O', 'T'}))
+
+        # A list short_list is memoized by its values, so changing it changes the valid values
+        short_list = [MK.ONE]
+        self.assertFalse(MK.is_valid('T', short_list))
+        short_list.append(MK.TWO)
+        self.assertTrue(MK.is_valid('T', short_list))
+
+        # A tuple short_list is memoized by identity
+        short_tuple = (MK.THREE,)
+        self.assertTrue(MK.is_valid('H', short_tuple))
+        self.assertFalse(MK.is_valid('H', (MK.ONE,)))
+
+    def test_are_valid(self):
+        """Test the bulk version of is_valid."""
+        self.assertEqual(MK.are_valid(['O', MK.TWO, 'X', None]), [True, True, False, False])
+        self.assertEqual(MK.are_valid(['O', 'T', 'H'], None, 'level'), [True, True, False])
+        self.assertEqual(MK.are_valid(['O', 'T'], ShortList1, 'level', 2), [False, True])
+        with self.assertRaises(ValueError):
+            MK.are_valid(['O'], None, None, 2)
+
+    def test_translated(self):
+        """Test the translated properties, resolved once per language."""
+        Status.clear_caches()
+        label = Status.NEW.translated()
+        self.assertEqual(label, "New")
+        self.assertIs(type(label), str)  # resolved, not a lazy translation
+        self.assertIs(Status.NEW.translated(), label)
+        self.assertEqual(Status.NEW.translated('symbol'), '🆕')
+        self.assertEqual(str(Status.NEW), "New")
+        self.assertEqual(MK.THREE.translated('level'), None)
+
+        # Each language has its own entries
+        with translation.override('fr'):
+            Status.NEW.translated()
+        self.assertEqual({key[0] for key in _translations[Status]}, {translation.get_language(), 'fr'})
+
+        # And the cache is cleared when the translation settings change
+        with override_settings(LANGUAGE_CODE='fr'):
+            self.assertNotIn(Status, _translations)
+
+
+"""
+python manage.py test core.tests.flexup_enum_cache
+"""
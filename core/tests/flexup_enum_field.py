@@ -0,0 +1,63 @@
+from django.forms import ValidationError
+from django.test import TestCase
+from core.models.flexup_enum_field import FlexUpEnumField
+from core.tests.flexup_enum_cache import MockEnum as MK
+
+
+class TestFlexUpEnumField(TestCase):
+    """Test suite for FlexUpEnumField conversions."""
+
+    def test_from_db_value(self):
+        """Test decoding the database values."""
+        field = FlexUpEnumField(flexup_enum=MK)
+        self.assertIs(field.from_db_value('T', None, None), MK.TWO)
+        self.assertIs(field.from_db_value(MK.THREE, None, None), MK.THREE)  # already decoded
+        self.assertIsNone(field.from_db_value('X', None, None))
+        self.assertIsNone(field.from_db_value(None, None, None))
+
+    def test_to_python_and_get_prep_value(self):
+        """Test converting input values, and the errors raised for invalid values."""
+        field = FlexUpEnumField(flexup_enum=MK)
+        field.name = 'mock'
+        self.assertIs(field.to_python('O'), MK.ONE)
+        self.assertIs(field.to_python(MK.TWO), MK.TWO)
+        self.assertEqual(field.get_prep_value('H'), 'H')
+        self.assertEqual(field.get_prep_value(MK.ONE), 'O')
+        self.assertIsNone(field.get_prep_value(None))
+
+        with self.assertRaisesMessage(ValidationError, "Invalid value 'X' for field mock. Must be one of ['O', 'T', 'H']"):
+            field.to_python('X')
+        with self.assertRaisesMessage(ValueError, "Invalid value '['O']' for field mock. Must be one of ['O', 'T', 'H']"):
+            field.get_prep_value(['O'])
+        self.assertIs(field.allowed_values, field.allowed_values)  # formatted once
+
+    def test_integer_storage(self):
+        """Test storing the enum instances as small integers."""
+        field = FlexUpEnumField(flexup_enum=MK, integer_storage=True, ordinals={'O': 0, 'T': 1, 'H': 2})
+        field.name = 'mock'
+        self.assertEqual(field.get_internal_type(), 'SmallIntegerField')
+        self.assertEqual(field.get_prep_value(MK.TWO), 1)
+        self.assertEqual(field.get_prep_value('H'), 2)
+        self.assertIs(field.from_db_value(1, None, None), MK.TWO)
+        self.assertIs(field.to_python('O'), MK.ONE)
+
+        # The mapping is written in the migrations
+        name, path, args, kwargs = field.deconstruct()
+        self.assertEqual((kwargs['integer_storage'], kwargs['ordinals']), (True, {'O': 0, 'T': 1, 'H': 2}))
+        self.assertEqual(FlexUpEnumField(**kwargs).ordinals, field.ordinals)
+
+        # An explicit mapping is used as is, and must map every value to a different integer
+        field = FlexUpEnumField(flexup_enum=MK, ordinals={'O': 3, 'T': 1, 'H': 2, 'X': 0})
+        self.assertIs(field.from_db_value(3, None, None), MK.ONE)
+        self.assertIsNone(field.from_db_value(0, None, None))  # removed item
+        self.assertEqual(field._check_ordinals(), [])
+        self.assertEqual([error.id for error in FlexUpEnumField(flexup_enum=MK, ordinals={'O': 1, 'T': 1})._check_ordinals()], ['core.E001', 'core.E002'])
+
+        # The declaration order is never used as mapping: adding an item would change the integers of the next ones
+        field = FlexUpEnumField(flexup_enum=MK, integer_storage=True)
+        self.assertEqual([error.id for error in field._check_ordinals()], ['core.E004'])
+
+
+"""
+python manage.py test core.tests.flexup_enum_field
+"""
@@ -1,6 +1,14 @@
 import datetime
 from django.test import TestCase
-from core.models.log_changes import DummyModel
+from core.enums.currency import Currency
+from core.models.log_changes import ChangeTrackingMixin, DummyModel, LogEntry, LogEntryLine, log_changes
+from decimal import Decimal as Dec
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from product.models import Product
+from unittest import mock
 
 # FILE: core/models/test_log_changes.py
 
@@ -41,6 +49,286 @@ class TestLogChanges(TestCase):
         self.dummy_instance.save()
 
 
+class LogTablesTestMixin:
+    """ Creates the LogEntry, LogEntryLine and DummyModel tables for the tests of the class (the models are not part of an installed app) """
+    log_models = [LogEntry, LogEntryLine, DummyModel]
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as schema_editor:  # before the class transaction: SQLite cannot alter the schema inside it
+            for model in cls.log_models:
+                schema_editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as schema_editor:
+            for model in reversed(cls.log_models):
+                schema_editor.delete_model(model)
+
+    def setUp(self):
+        super().setUp()
+        ContentType.objects.clear_cache()  # the content types created by the previous tests were rolled back
+
+
+class LogChangesWritesTest(LogTablesTestMixin, TestCase):
+
+    def test_lines_are_written_with_one_bulk_insert(self):
+        # Given: an instance with two changed fields and one unchanged field
+        instance = DummyModel(pk=1)
+        old_values = {'name': "Initial Name", 'description': "Initial Description", 'value': 10}
+        new_values = {'name': "Updated Name", 'description': "Initial Description", 'value': 20}
+        ContentType.objects.get_for_model(instance)  # cached content type
+
+        # When: the changes are logged
+        with CaptureQueriesContext(connection) as queries, \
+                self.assertLogs('core.models.log_changes', level='DEBUG') as logs:
+            log_entry = log_changes(instance, "dummy_member", old_values, new_values)
+
+        # Then: one entry is stored, and its two lines are inserted in a single query
+        inserts = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(list(LogEntryLine.objects.filter(log_entry=log_entry).values_list('field_name', flat=True)), ['name', 'value'])
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(logs.records[0].field_name, 'name')
+
+    def test_no_line_written_if_nothing_changed(self):
+        # Given: an instance without any change
+        instance = DummyModel(pk=1)
+        values = {'name': "Initial Name", 'value': 10}
+
+        # When: the changes are logged
+        log_entry = log_changes(instance, "dummy_member", values, dict(values))
+
+        # Then: the entry has no line
+        self.assertFalse(log_entry.log_entry_lines.exists())
+
+    def test_asynchronous_mode_queues_the_entry(self):
+        # Given: an instance with one changed field
+        instance = DummyModel(pk=1)
+
+        # When: the changes are logged in asynchronous mode
+        with mock.patch('core.models.log_changes.audit_queue') as audit_queue, \
+                self.settings(AUDIT_LOG_ASYNC=True), \
+                self.captureOnCommitCallbacks(execute=True):
+            log_entry = log_changes(instance, "dummy_member", {'value': 10}, {'value': 20})
+
+        # Then: the entry and its line are queued on commit, with the database of the instance, instead of being written
+        self.assertFalse(LogEntry.objects.exists())
+        queued_entry, queued_lines = audit_queue.put.call_args.args[0]
+        self.assertIs(queued_entry, log_entry)
+        self.assertEqual(audit_queue.put.call_args.kwargs['using'], 'default')
+        self.assertEqual([(line.field_name, line.old_value, line.new_value) for line in queued_lines], [('value', 10, 20)])
+
+    def test_asynchronous_mode_rolled_back(self):
+        # Given: an instance with one changed field
+        instance = DummyModel(pk=1)
+
+        # When: the changes are logged in asynchronous mode, in a transaction which is rolled back
+        with mock.patch('core.models.log_changes.audit_queue') as audit_queue, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    log_changes(instance, "dummy_member", {'value': 10}, {'value': 20}, asynchronous=True)
+                    raise RuntimeError("business error")
+
+        # Then: nothing is queued
+        self.assertEqual(callbacks, [])
+        audit_queue.put.assert_not_called()
+
+
+class TrackedProduct(ChangeTrackingMixin, Product):
+    """ Product with tracked changes, stored in the product table """
+    class Meta:
+        proxy = True
+        app_label = 'product'
+
+
+@mock.patch('core.models.log_changes.log_changes')
+class ChangeTrackingTest(TestCase):
+    """ The LogEntry and LogEntryLine tables are not created in the test database, so log_changes is patched """
+
+    def setUp(self):
+        super().setUp()
+        ContentType.objects.clear_cache()  # the TrackedProduct content type is not created by the migrations: the one created by a previous test was rolled back
+
+    def test_only_changed_fields_are_logged_and_saved(self, log_changes):
+        # Given: a DummyModel loaded from the database (the save itself is patched, as its table is not created either)
+        instance = DummyModel.from_db('default', ['id', 'name', 'description', 'value', 'datetime'], [1, "Initial Name", "Initial Description", 10, None])
+
+        # When: two fields are changed and the instance is saved
+        instance.name = "Updated Name"
+        instance.value = 20
+        with mock.patch.object(models.Model, 'save', autospec=True) as save:
+            instance.save()
+
+        # Then: only the changed fields are logged and saved
+        log_changes.assert_called_once_with(instance, None, {'name': "Initial Name", 'value': 10}, {'name': "Updated Name", 'value': 20})
+        self.assertEqual(save.call_args.kwargs['update_fields'], ['name', 'value'])
+        self.assertEqual(instance.get_changed_fields(), {})
+
+    def test_unchanged_instance_is_saved_without_logging(self, log_changes):
+        # Given: a DummyModel loaded from the database
+        instance = DummyModel.from_db('default', ['id', 'name', 'description', 'value', 'datetime'], [1, "Initial Name", "Initial Description", 10, None])
+
+        # When: it is saved without any change
+        with mock.patch.object(models.Model, 'save', autospec=True) as save:
+            instance.save()
+
+        # Then: it is saved as usual (signals, auto_now fields), but nothing is logged
+        save.assert_called_once()
+        self.assertNotIn('update_fields', save.call_args.kwargs)
+        log_changes.assert_not_called()
+
+    def test_member_provided_to_save(self, log_changes):
+        # Given: a DummyModel loaded from the database, with one field changed
+        instance = DummyModel.from_db('default', ['id', 'name', 'description', 'value', 'datetime'], [1, "Initial Name", "Initial Description", 10, None])
+        instance.value = 20
+
+        # When: it is saved with a member
+        with mock.patch.object(models.Model, 'save', autospec=True):
+            instance.save("member")
+
+        # Then: the member is recorded in the log entry
+        self.assertEqual(log_changes.call_args.args[1], "member")
+
+    def test_flexup_model_changes_saved_without_select(self, log_changes):
+        # Given: a product with tracked changes, loaded from the database
+        TrackedProduct.objects.create(name="Potatoes", price_excluding_tax=Dec('100.00'), currency=Currency.USD)
+        product = TrackedProduct.objects.get(name="Potatoes")
+
+        # When: its price is changed and it is saved
+        product.price_excluding_tax = Dec('120.00')
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+
+        # Then: the old values are not read again, and only the price column is updated
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertFalse([sql for sql in statements if sql.startswith('SELECT')])
+        update = next(sql for sql in statements if sql.startswith('UPDATE'))
+        self.assertIn('price_excluding_tax', update)
+        self.assertNotIn('"name"', update)
+        log_changes.assert_called_once_with(product, None, {'price_excluding_tax': Dec('100.00')}, {'price_excluding_tax': Dec('120.00')})
+        self.assertEqual(Product.objects.get(pk=product.pk).price_excluding_tax, Dec('120.00'))
+
+    def test_deferred_field_set_then_saved(self, log_changes):
+        # Given: a product loaded without its price
+        TrackedProduct.objects.create(name="Potatoes", price_excluding_tax=Dec('100.00'), currency=Currency.USD)
+        product = TrackedProduct.objects.only('id', 'name').get(name="Potatoes")
+
+        # When: its price is set and it is saved
+        product.price_excluding_tax = Dec('120.00')
+        product.save()
+
+        # Then: the price is saved and logged, with an unknown old value
+        self.assertEqual(Product.objects.get(pk=product.pk).price_excluding_tax, Dec('120.00'))
+        log_changes.assert_called_once_with(product, None, {'price_excluding_tax': None}, {'price_excluding_tax': Dec('120.00')})
+
+    def test_partial_refresh_keeps_other_changes(self, log_changes):
+        # Given: a product loaded from the database, with its name changed in memory
+        TrackedProduct.objects.create(name="Potatoes", price_excluding_tax=Dec('100.00'), currency=Currency.USD)
+        product = TrackedProduct.objects.get(name="Potatoes")
+        product.name = "Sweet potatoes"
+
+        # When: its price is refreshed from the database, then it is saved
+        Product.objects.filter(pk=product.pk).update(price_excluding_tax=Dec('110.00'))
+        product.refresh_from_db(fields=['price_excluding_tax'])
+        product.save()
+
+        # Then: the name change is still saved and logged, and the refreshed price is not a change
+        saved_product = Product.objects.get(pk=product.pk)
+        self.assertEqual((saved_product.name, saved_product.price_excluding_tax), ("Sweet potatoes", Dec('110.00')))
+        log_changes.assert_called_once_with(product, None, {'name': "Potatoes"}, {'name': "Sweet potatoes"})
+
+
+@mock.patch('core.models.log_changes.write_log_entries')
+class AuditedUpdateTest(TestCase):
+    """ The LogEntry and LogEntryLine tables are not created in the test database, so write_log_entries is patched """
+
+    def setUp(self):
+        self.potatoes = Product.objects.create(name="Potatoes", price_excluding_tax=Dec('100.00'), currency=Currency.USD)
+        self.rice = Product.objects.create(name="Rice", price_excluding_tax=Dec('2.00'), currency=Currency.EUR)
+        self.flour = Product.objects.create(name="Flour", price_excluding_tax=Dec('2.00'), currency=Currency.EUR)
+
+    def logged_changes(self, write_log_entries) -> dict:
+        """ Return the changes passed to write_log_entries, as object id → [(field, old value, new value)] """
+        records = write_log_entries.call_args.args[0]
+        return {log_entry.object_id: [(line.field_name, line.old_value, line.new_value) for line in lines] for log_entry, lines in records}
+
+    def test_audited_update(self, write_log_entries):
+        # When: the price of all the products is set to 2.00
+        with self.assertNumQueries(4):  # savepoint, pre-image, update, savepoint release (write_log_entries is patched)
+            count = Product.objects.order_by('pk').audited_update(price_excluding_tax=Dec('2.00'))
+
+        # Then: all the products are updated, and only the product whose price changed is logged
+        self.assertEqual(count, 3)
+        self.assertEqual(self.logged_changes(write_log_entries), {self.potatoes.pk: [('price_excluding_tax', Dec('100.00'), Dec('2.00'))]})
+        self.assertEqual(Product.objects.filter(price_excluding_tax=Dec('2.00')).count(), 3)
+
+    def test_audited_update_with_expression(self, write_log_entries):
+        # When: the price of the products in EUR is doubled
+        count = Product.objects.filter(currency=Currency.EUR).audited_update(price_excluding_tax=F('price_excluding_tax') * 2)
+
+        # Then: the new prices are read after the update, and logged
+        self.assertEqual(count, 2)
+        self.assertEqual(self.logged_changes(write_log_entries), {
+            self.rice.pk: [('price_excluding_tax', Dec('2.00'), Dec('4.00'))],
+            self.flour.pk: [('price_excluding_tax', Dec('2.00'), Dec('4.00'))],
+        })
+
+    def test_audited_bulk_update(self, write_log_entries):
+        # Given: products changed in memory
+        self.potatoes.price_excluding_tax = Dec('90.00')
+        self.rice.currency = Currency.USD
+
+        # When: they are updated in bulk
+        with self.assertNumQueries(4):  # savepoint, pre-image, update, savepoint release
+            count = Product.objects.audited_bulk_update([self.potatoes, self.rice, self.flour], ['price_excluding_tax', 'currency'])
+
+        # Then: each change is logged, and the rows are updated
+        self.assertEqual(count, 3)
+        self.assertEqual(self.logged_changes(write_log_entries), {
+            self.potatoes.pk: [('price_excluding_tax', Dec('100.00'), Dec('90.00'))],
+            self.rice.pk: [('currency', Currency.EUR, Currency.USD)],
+        })
+        self.assertEqual(Product.objects.get(pk=self.rice.pk).currency, Currency.USD)
+
+
+class LogChangesDatabaseTest(LogTablesTestMixin, TestCase):
+
+    def test_save_writes_entry_and_lines(self):
+        # Given: a DummyModel loaded from the database
+        DummyModel.objects.create(name="Initial Name", description="Initial Description", value=10)
+        instance = DummyModel.objects.get(name="Initial Name")
+
+        # When: two fields are changed and the instance is saved
+        instance.name = "Updated Name"
+        instance.value = 20
+        instance.save("member")
+
+        # Then: one entry is stored, linked to the instance, with a line per changed field
+        log_entry = LogEntry.objects.get()
+        self.assertEqual((log_entry.content_type, log_entry.object_id, log_entry.dummy_member), (ContentType.objects.get_for_model(DummyModel), instance.pk, "member"))
+        self.assertEqual(
+            sorted(log_entry.log_entry_lines.values_list('field_name', 'old_value', 'new_value')),
+            [('name', "Initial Name", "Updated Name"), ('value', '10', '20')],
+        )
+
+    def test_audited_update_writes_entries_and_lines(self):
+        # Given: two products
+        Product.objects.create(name="Potatoes", price_excluding_tax=Dec('100.00'), currency=Currency.USD)
+        Product.objects.create(name="Rice", price_excluding_tax=Dec('2.00'), currency=Currency.EUR)
+
+        # When: their price is set to 2.00
+        Product.objects.audited_update(price_excluding_tax=Dec('2.00'))
+
+        # Then: only the changed product has an entry, and its line is linked to it
+        line = LogEntryLine.objects.select_related('log_entry').get()
+        self.assertEqual((line.log_entry.content_type, line.log_entry.object_id), (ContentType.objects.get_for_model(Product), Product.objects.get(name="Potatoes").pk))
+        self.assertEqual((line.field_name, Dec(line.old_value), Dec(line.new_value)), ('price_excluding_tax', Dec('100.00'), Dec('2.00')))
+
+
 """ #         # Verify that changes are logged
 #         log_entry = LogEntry.objects.first()
 #         self.assertIsNotNone(log_entry)
@@ -0,0 +1,54 @@
+from core.enums.currency import Currency
+from core.utils.rate_cache import RateCache
+from datetime import timedelta
+from decimal import Decimal as Dec
+from django.test import SimpleTestCase
+from django.utils import timezone
+from freezegun import freeze_time
+
+
+class TestRateCache(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = RateCache()
+        self.now = timezone.now()
+
+    def test_01_miss_then_hit(self):
+        # Given an empty cache
+        # When a rate is looked up, it is a miss
+        self.assertIsNone(self.cache.get(Currency.USD))
+        self.assertEqual(self.cache.misses, 1)
+
+        # When the rate is stored and looked up again, it is a hit
+        self.cache.set(Currency.USD, Dec('0.850000'), self.now)
+        self.assertEqual(self.cache.get(Currency.USD), Dec('0.850000'))
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5, 'size': 1})
+
+    def test_02_entries_expire_with_the_stored_rate(self):
+        # Given a rate fetched 23 hours ago
+        self.cache.set(Currency.USD, Dec('0.850000'), self.now - timedelta(hours=23))
+
+        # Then it is still valid for one hour
+        self.assertEqual(self.cache.get(Currency.USD), Dec('0.850000'))
+
+        # And once the 24 hours are over, it is evicted
+        with freeze_time(self.now + timedelta(hours=1, seconds=1)):
+            self.assertIsNone(self.cache.get(Currency.USD))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_03_invalidate(self):
+        # Given a cache with two rates
+        self.cache.set(Currency.USD, Dec('0.850000'), self.now)
+        self.cache.set(Currency.JPY, Dec('0.007874'), self.now)
+
+        # When one currency is invalidated, only that one is removed
+        self.cache.invalidate(Currency.USD)
+        self.assertIsNone(self.cache.get(Currency.USD))
+        self.assertEqual(self.cache.get(Currency.JPY), Dec('0.007874'))
+
+        # When the whole cache is invalidated, it is empty, but the counters are kept until reset
+        self.cache.invalidate()
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.hits, 1)
+        self.cache.reset_stats()
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 0))
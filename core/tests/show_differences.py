@@ -1,6 +1,7 @@
 from django.test import SimpleTestCase
 # from ..show_differences import show_differences_combined as show_differences
 from core.utils.show_differences import show_differences_separate as show_differences
+from core.utils.show_differences import MAX_DIFF_WORDS, show_differences_combined
 
 """ Tests shows differences between two texts with changes highlighted. Two versions are provided:
     - show_differences_combined: Returns a single string with changes highlighted, containing extracts from both text1 and text2.
@@ -98,4 +99,35 @@ class TestAbbreviateText(SimpleTestCase):
         print(show_differences(text1, text2))
         self.assertEqual(1,1)
         #  expected = "... lazy dog *non stop: in the morning, in the evening and the night - litterally* every hour ..."
-        # self.assertEqual(show_differences(text1, text2), expected)
\ No newline at end of file
+        # self.assertEqual(show_differences(text1, text2), expected)
+
+
+class TestShowDifferencesLongTexts(SimpleTestCase):
+
+    def setUp(self):
+        self.words = [f"word{index % 500}" for index in range(10000)]
+
+    def test_01_one_change_in_a_long_text(self):
+        # Given a 10,000 words text with one word changed in the middle
+        text1 = ' '.join(self.words)
+        words2 = list(self.words)
+        words2[5000] = "changed"
+        text2 = ' '.join(words2)
+
+        # Then only the change and its context are shown
+        self.assertEqual(show_differences(text1, text2), ['... word498 word499 ~~word0~~ word1 word2 ...', '... word498 word499 **changed** word1 word2 ...'])
+        self.assertEqual(show_differences_combined(text1, text2), '... word498 word499 ~~word0~~ **changed** word1 word2 ...')
+
+    def test_02_changes_too_long_to_compare(self):
+        # Given two long texts differing on more than MAX_DIFF_WORDS words, with the same start and end
+        middle1 = [f"old{index}" for index in range(MAX_DIFF_WORDS)]
+        middle2 = [f"new{index}" for index in range(10)]
+        text1 = ' '.join(self.words[:100] + middle1 + self.words[:100])
+        text2 = ' '.join(self.words[:100] + middle2 + self.words[:100])
+
+        # Then the changed part is summarized, with its first words and its length
+        self.assertEqual(show_differences(text1, text2), [
+            f'... word98 word99 ~~old0 old1 old2 old3 old4 ... ({MAX_DIFF_WORDS} words)~~ word0 word1 ...',
+            '... word98 word99 **new0 new1 new2 new3 new4 ... (10 words)** word0 word1 ...',
+        ])
+
@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+from core.utils.single_flight import SingleFlight
+from django.test import SimpleTestCase
+import asyncio
+import threading
+import time
+
+
+class TestSingleFlight(SimpleTestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def slow_fetch(self, result='rate'):
+        with self.calls_lock:
+            self.calls += 1
+        time.sleep(0.1)
+        return result
+
+    def failing_fetch(self):
+        self.slow_fetch()
+        raise ValueError("API unavailable")
+
+    def test_01_concurrent_threads_share_one_call(self):
+        # Given 20 threads missing the same rate at the same time
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            results = list(executor.map(lambda _: self.flights.do('USD', self.slow_fetch), range(20)))
+
+        # Then the function is called only once, and all the threads get its result
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['rate'] * 20)
+
+    def test_02_different_keys_are_not_coalesced(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(lambda key: self.flights.do(key, self.slow_fetch, key), ['USD', 'JPY']))
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(results, ['USD', 'JPY'])
+
+    def test_03_errors_are_shared_and_key_is_released(self):
+        # When the leader fails, all the waiters get the same error
+        def call(_):
+            try:
+                return self.flights.do('USD', self.failing_fetch)
+            except ValueError as error:
+                return error
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            errors = list(executor.map(call, range(5)))
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+
+        # And the next call runs the function again
+        self.assertEqual(self.flights.do('USD', self.slow_fetch), 'rate')
+        self.assertEqual(self.calls, 2)
+
+    def test_04_concurrent_coroutines_share_one_call(self):
+        # Given 20 coroutines missing the same rate at the same time
+        async def main():
+            return await asyncio.gather(*[self.flights.do_async('USD', self.slow_fetch) for _ in range(20)])
+        results = asyncio.run(main())
+
+        # Then the function is called only once, and all the coroutines get its result
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['rate'] * 20)
+
+    def test_05_leader_cancelled(self):
+        # Given 5 coroutines missing the same rate, the first one leading the call
+        async def main():
+            tasks = [asyncio.create_task(self.flights.do_async('USD', self.slow_fetch)) for _ in range(5)]
+            await asyncio.sleep(0.02)
+
+            # When the leader is cancelled (eg: its client disconnected)
+            tasks[0].cancel()
+            return await asyncio.gather(*tasks, return_exceptions=True)
+        results = asyncio.run(main())
+
+        # Then only the leader is cancelled: the other coroutines get the result of the single call
+        self.assertIsInstance(results[0], asyncio.CancelledError)
+        self.assertEqual(results[1:], ['rate'] * 4)
+        self.assertEqual(self.calls, 1)
@@ -0,0 +1,139 @@
+# ------- core/utils/audit_queue.py
+
+from django.db import close_old_connections
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AuditQueue:
+    """ Bounded in-process queue of audit records, written in batches by a background thread, so that the saves do not wait for the audit inserts
+      - Description:
+          - put adds a record to the queue and returns at once; the worker thread (started on the first put) writes the records in batches
+          - a batch is written as soon as it holds batch_size records, or flush_interval seconds after its first record
+          - each record keeps the database alias given to put: the records of a batch are written with one write_batch call per database
+          - back-pressure: when the queue is full, put blocks up to put_timeout seconds, then writes the record itself, so that no record is lost
+          - flush writes all the pending records before returning (for tests, and at shutdown: it is registered with atexit)
+          - a write which fails is retried up to retries times (eg: database restarting), then the records are written one by one,
+            so that a record which cannot be written does not lose the others: only that record is then logged as an error
+      - Attributes:
+          - write_batch (callable): function writing a list of records in a database: write_batch(records, using=None) (eg: with bulk_create)
+          - batch_size (int): maximum number of records written at once
+          - flush_interval (float): maximum number of seconds a record waits in the queue before being written
+          - put_timeout (float): maximum number of seconds put blocks when the queue is full
+          - retries (int): number of retries of a failed write
+          - retry_delay (float): number of seconds before the first retry, doubled at each retry
+      - Methods:
+          - put, flush, pending
+    """
+    def __init__(self, write_batch, max_size: int = 10000, batch_size: int = 500, flush_interval: float = 1.0, put_timeout: float = 5.0,
+                 retries: int = 3, retry_delay: float = 1.0):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def pending(self) -> int:
+        """ Return the number of records waiting in the queue (records being written are not counted) """
+        return self._queue.qsize()
+
+    def put(self, record, using=None):
+        """ Add a record to the queue, to be written by the worker thread in the database using (default: the database chosen by write_batch)
+          - Blocks up to put_timeout seconds if the queue is full, then writes the record in the calling thread
+        """
+        self._start()
+        try:
+            self._queue.put((using, record), timeout=self.put_timeout)
+        except queue.Full:
+            logger.warning("Audit queue full: record written synchronously")
+            self.write_batch([record], using=using)
+
+    def flush(self):
+        """ Write all the pending records, in the calling thread, and wait for the batch being written by the worker, if any """
+        while True:
+            batch = self._get_batch(timeout=None)
+            if not batch:
+                break
+            self._write(batch)
+        self._queue.join()
+
+    def _start(self):
+        """ Start the worker thread, if not running yet (eg: on the first put, or after a fork) """
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                if self._worker is None:
+                    atexit.register(self.flush)
+                self._worker = threading.Thread(target=self._run, name="audit-queue", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        """ Worker loop: wait for a first record, gather the batch until it is full or flush_interval is over, then write it """
+        while True:
+            first_record = self._queue.get()
+            batch = [first_record] + self._get_batch(timeout=self.flush_interval, size=self.batch_size - 1)
+            close_old_connections()  # the worker has its own database connection: drop it if it is broken or too old
+            try:
+                self._write(batch, release_connections=True)
+            finally:
+                close_old_connections()
+
+    def _get_batch(self, timeout=None, size=None) -> list:
+        """ Take up to size records (default: batch_size) from the queue, waiting up to timeout seconds for them (default: no wait) """
+        size = self.batch_size if size is None else size
+        deadline = None if timeout is None else time.monotonic() + timeout
+        batch = []
+        while len(batch) < size:
+            try:
+                if deadline is None:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch, release_connections=False):
+        """ Write a batch of (using, record) items, with one write_batch call per database, then mark them as done (even if a write fails, so that flush does not wait forever)
+          - release_connections: drop the broken database connections before each retry (worker thread only: the calling thread may be in a transaction)
+        """
+        try:
+            records_by_database = {}
+            for using, record in batch:
+                records_by_database.setdefault(using, []).append(record)
+            for using, records in records_by_database.items():
+                self._write_records(records, using, release_connections)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_records(self, records, using, release_connections):
+        """ Write the records of one database, retrying on errors, then one record at a time if they still cannot be written together """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+                if release_connections:
+                    close_old_connections()
+            try:
+                self.write_batch(records, using=using)
+                return
+            except Exception:
+                logger.warning("Could not write %s audit records (attempt %s of %s)", len(records), attempt + 1, self.retries + 1, exc_info=True)
+        if len(records) == 1:
+            logger.error("Audit record not written: %r", records[0])
+            return
+        for record in records:  # eg: one invalid record: the others are still written
+            try:
+                self.write_batch([record], using=using)
+            except Exception:
+                logger.exception("Audit record not written: %r", record)
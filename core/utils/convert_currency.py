@@ -1,25 +1,187 @@
 # ------- core/utils/convert_currency.py
- 
-from django.utils import timezone
+
 from core.enums.currency import Currency
+from core.models.exchange_rate import ExchangeRate
+from core.utils.fetch_exchange_rate import fetch_exchange_rate
+from core.utils.rate_cache import RATE_VALIDITY, rate_cache
+from core.utils.refresh_exchange_rates import count_stale_currencies, is_bulk_refresh_due, is_provided_by_bulk_api, refresh_exchange_rates
+from core.utils.single_flight import SingleFlight
+from datetime import timedelta
+from decimal import Decimal as Dec, ROUND_HALF_UP
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+PRICE_QUANTUM = Dec('0.0001')  # prices are stored with 4 decimals (see Guidelines)
+FETCH_RETRY_DELAY = timedelta(minutes=10)  # a currency whose rate could not be fetched is not fetched again before this delay
+
+rate_loads = SingleFlight()  # only one database lookup / API fetch per currency at a time, shared by all the waiting threads & coroutines
 
-# Not yet implemented
-def convert_currency(value, from_currency: Currency = None, to_currency: Currency = None, date=None) -> Decimal:
-    """ - Convert a value (price or amount) from one currency to another. 
+
+def convert_currency(value, from_currency: Currency = None, to_currency: Currency = None, date=None) -> Dec:
+    """ - Convert a value (price or amount) from one currency to another.
     - Args:
         - value: The value to convert.
-        - from_currency: The currency to convert from.
-        - to_currency: The currency to convert to.
-        - date: The date to use for the conversion rate. If None, the current date is used.
+        - from_currency: The currency to convert from (Currency or currency code).
+        - to_currency: The currency to convert to (Currency or currency code).
+        - date: The date to use for the conversion rate. Not supported yet: the latest valid rate is always used.
     - Returns:
-        - The converted value if both currencies are different
-        - The original value if either currency is None, or if they are the same.
+        - The converted value, with 4 decimals, if both currencies are different
+        - The original value if to_currency is None, or if both currencies are the same.
+    - Raises:
+        - ValidationError: if from_currency is not provided, if either currency is not valid, or if the rate cannot be fetched
     """
-    if from_currency is None or to_currency is None or from_currency == to_currency:
+    from_currency = _validate_currency(from_currency, required=True)
+    to_currency = _validate_currency(to_currency)
+    if to_currency is None or from_currency == to_currency:
+        return value
+
+    factor = get_exchange_rate(from_currency) / get_exchange_rate(to_currency)
+    return (Dec(value) * factor).quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+async def aconvert_currency(value, from_currency: Currency = None, to_currency: Currency = None, date=None) -> Dec:
+    """ Async version of convert_currency, for ASGI views. Args, Returns and Raises: see convert_currency """
+    from_currency = _validate_currency(from_currency, required=True)
+    to_currency = _validate_currency(to_currency)
+    if to_currency is None or from_currency == to_currency:
         return value
-    else:
-        print("Warning: currency converion not implemented yet. Multiplying by 2 instead.")
-        if not date: 
-            date = timezone.now()
-            
-        return value * 2
+
+    factor = await aget_exchange_rate(from_currency) / await aget_exchange_rate(to_currency)
+    return (Dec(value) * factor).quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def convert_currencies(values, from_currencies, to_currencies=None, use_numpy=False):
+    """ - Batch version of convert_currency: convert a sequence of values, each from its own source currency to its own target currency.
+    - The rate of each distinct currency is resolved once, and the conversion applied in a single pass.
+    - Args:
+        - values: The sequence of values to convert.
+        - from_currencies: The currency to convert from, either one Currency for all the values, or a sequence parallel to values.
+        - to_currencies: The currency to convert to, either one Currency (or None) for all the values, or a sequence parallel to values.
+        - use_numpy: If True, compute with numpy float arrays (faster for large sequences, but with float precision).
+    - Returns:
+        - list of Decimal, in the same order as values (as with convert_currency, values with no or the same target currency are returned unchanged)
+        - numpy array of floats rounded to 4 decimals, if use_numpy is True
+    - Raises:
+        - ValidationError: if the sequences do not have the same length, or for the same reasons as convert_currency
+        - ImportError: if use_numpy is True and numpy is not installed
+    """
+    if use_numpy:
+        try:
+            import numpy as np  # imported on use: numpy is optional, and this module is imported at startup (by product.models)
+        except ImportError:
+            raise ImportError("numpy is required to convert currencies with use_numpy=True") from None
+
+    count = len(values)
+    from_currencies = _broadcast(from_currencies, count)
+    to_currencies = _broadcast(to_currencies, count)
+
+    factors = {}  # (from_currency, to_currency) → factor, or None if no conversion is required
+    for currency_pair in set(zip(from_currencies, to_currencies)):
+        from_currency = _validate_currency(currency_pair[0], required=True)
+        to_currency = _validate_currency(currency_pair[1])
+        if to_currency is None or from_currency == to_currency:
+            factors[currency_pair] = None
+        else:
+            factors[currency_pair] = get_exchange_rate(from_currency) / get_exchange_rate(to_currency)
+
+    row_factors = [factors[currency_pair] for currency_pair in zip(from_currencies, to_currencies)]
+
+    if use_numpy:
+        array_factors = np.array([1.0 if factor is None else float(factor) for factor in row_factors])
+        return np.round(np.asarray(values, dtype=float) * array_factors, 4)
+
+    return [
+        value if factor is None else (Dec(value) * factor).quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+        for value, factor in zip(values, row_factors)
+    ]
+
+
+def get_exchange_rate(currency: Currency) -> Dec:
+    """ Return the rate of a currency to the Euro
+    - The rate is searched, in this order:
+        - in the process-local rate cache (no database query)
+        - in the database, if the latest ExchangeRate is less than 24 hours old
+        - from the external API, in which case a new ExchangeRate is stored in the database
+    - On a cache miss, concurrent callers for the same currency wait for a single database lookup / API fetch and share its result
+    - Args:
+        - currency (Currency): the currency to get the rate for
+    - Returns:
+        - Decimal: value of 1 unit of the currency in EUR (1 for EUR)
+    - Raises:
+        - ValidationError: if the rate has to be fetched and the API call fails
+    """
+    if currency == Currency.EUR:
+        return Dec(1)
+
+    rate = rate_cache.get(currency)
+    if rate is not None:
+        return rate
+
+    return rate_loads.do(currency, _load_exchange_rate, currency)
+
+
+async def aget_exchange_rate(currency: Currency) -> Dec:
+    """ Async version of get_exchange_rate: concurrent coroutines (and threads) missing the same rate share a single fetch """
+    if currency == Currency.EUR:
+        return Dec(1)
+
+    rate = rate_cache.get(currency)
+    if rate is not None:
+        return rate
+
+    return await rate_loads.do_async(currency, _load_exchange_rate, currency)
+
+
+def _load_exchange_rate(currency: Currency) -> Dec:
+    """ Load the latest valid rate of a currency from the database, or fetch it from the API if none, and store it in the rate cache
+    - If more than EXCHANGE_RATE_BULK_THRESHOLD currencies are stale, all the rates are refreshed at once instead (one API call, one bulk insert),
+      at most once every BULK_REFRESH_INTERVAL
+    - A currency which the bulk API does not provide, or whose fetch failed, is not fetched again before FETCH_RETRY_DELAY: the same error is raised
+    """
+    exchange_rate = ExchangeRate.objects\
+        .filter(currency=currency, datetime__gte=timezone.now() - RATE_VALIDITY)\
+        .order_by('-datetime')\
+        .first()
+    if exchange_rate is None:
+        error = rate_cache.get_failure(currency)
+        if error is not None:
+            raise error
+    if exchange_rate is None and is_bulk_refresh_due() and count_stale_currencies() > settings.EXCHANGE_RATE_BULK_THRESHOLD:
+        refreshed_rates = rate_loads.do('__all__', refresh_exchange_rates)
+        if currency in refreshed_rates:
+            return refreshed_rates[currency]
+    if exchange_rate is None:
+        try:
+            if not is_provided_by_bulk_api(currency):
+                raise ValidationError(_("No exchange rate available for %(currency)s"), params={'currency': currency.value})
+            exchange_rate = ExchangeRate.objects.create(currency=currency, rate=fetch_exchange_rate(currency))
+        except ValidationError as error:
+            rate_cache.set_failure(currency, error, timezone.now() + FETCH_RETRY_DELAY)
+            raise
+
+    rate = Dec(exchange_rate.rate)
+    rate_cache.set(currency, rate, exchange_rate.datetime)
+    return rate
+
+
+def _broadcast(currencies, count) -> list:
+    """ Return a list of count currencies: the sequence provided, or the single currency (or None) repeated """
+    if currencies is None or isinstance(currencies, (Currency, str)):
+        return [currencies] * count
+    currencies = list(currencies)
+    if len(currencies) != count:
+        raise ValidationError(_("Expected %(count)s currencies, got %(received)s"), params={'count': count, 'received': len(currencies)})
+    return currencies
+
+
+def _validate_currency(currency, required=False) -> Currency:
+    """ Return the Currency matching the currency (or currency code) provided, or None if not provided and not required """
+    if currency is None:
+        if required:
+            raise ValidationError(_("The source currency must be provided"))
+        return None
+    if not Currency.is_valid(currency):
+        raise ValidationError(_("Invalid currency: %(currency)s"), params={'currency': currency})
+    return currency if isinstance(currency, Currency) else Currency(currency)
@@ -0,0 +1,88 @@
+# ------- core/utils/convert_price.py
+
+from core.enums.currency import Currency
+from core.utils.convert_currency import PRICE_QUANTUM, _validate_currency, get_exchange_rate
+from core.utils.convert_unit import get_unit_factor
+from core.utils.rate_cache import rate_cache
+from decimal import Decimal as Dec, ROUND_HALF_UP
+from django.utils import timezone
+import threading
+
+_price_factors = {}             # (from_currency, to_currency, from_unit, to_unit) → (factor or None, expiry datetime or None), for the current rate snapshot
+_price_factors_version = None   # rate_cache.version the price factors were computed with
+_price_factors_lock = threading.Lock()
+
+
+def convert_price(value, from_currency: Currency = None, to_currency: Currency = None, from_unit=None, to_unit=None) -> Dec:
+    """ - Convert a price to another currency and another unit (eg: 10 €/kg → 0.0085 $/g).
+    - The combined currency & unit factor of each (from_currency, to_currency, from_unit, to_unit) is cached until the rates change or expire,
+      so that converting many prices with the same currencies & units costs one multiplication and one rounding per price.
+    - Args:
+        - value: The price to convert.
+        - from_currency, to_currency: The currencies to convert from and to (see convert_currency).
+        - from_unit, to_unit: The units to convert from and to (see convert_unit).
+    - Returns:
+        - The converted price, with 4 decimals (or the original price if neither the currency nor the unit change)
+    - Raises:
+        - ValidationError: see convert_currency and convert_unit
+    """
+    key = (from_currency, to_currency, from_unit, to_unit)
+    entry = _price_factors.get(key) if _price_factors_version == rate_cache.version else None
+    if entry is None or (entry[1] is not None and timezone.now() >= entry[1]):
+        entry = _get_price_factor(key)
+
+    factor = entry[0]
+    if factor is None:
+        return value
+    return (Dec(value) * factor).quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def _get_price_factor(key) -> tuple:
+    """ Compute the (factor, expiry) of a (from_currency, to_currency, from_unit, to_unit) key, and cache it for the current rate snapshot
+    - factor is None if neither the currency nor the unit change; expiry is None if the factor does not depend on any rate
+    - If the rates change while the factor is computed (eg: a missing rate was just loaded), it is computed again from the new snapshot
+    """
+    for _attempt in range(2):
+        version = rate_cache.version
+        entry, cacheable = _compute_price_factor(*key)
+        if rate_cache.version == version:
+            break
+    else:
+        return entry  # the rates keep changing: do not cache
+
+    if cacheable:
+        _store_price_factor(key, entry, version)
+    return entry
+
+
+def _compute_price_factor(from_currency, to_currency, from_unit, to_unit) -> tuple:
+    """ Return ((factor, expiry), cacheable), see _get_price_factor """
+    from_currency = _validate_currency(from_currency, required=True)
+    to_currency = _validate_currency(to_currency)
+
+    factor, expiry, cacheable = None, None, True
+    if to_currency is not None and from_currency != to_currency:
+        factor = get_exchange_rate(from_currency) / get_exchange_rate(to_currency)
+        for currency in (from_currency, to_currency):
+            if currency == Currency.EUR:
+                continue
+            currency_expiry = rate_cache.get_expiry(currency)
+            if currency_expiry is None:  # the rate is not in the cache: do not cache a factor without a known expiry
+                cacheable = False
+            elif expiry is None or currency_expiry < expiry:
+                expiry = currency_expiry
+    if to_unit is not None and from_unit != to_unit:
+        unit_factor = get_unit_factor(from_unit, to_unit)
+        factor = unit_factor if factor is None else factor * unit_factor
+    return (factor, expiry), cacheable
+
+
+def _store_price_factor(key, entry, version):
+    """ Cache a price factor computed with the given rate_cache version, discarding the factors of older snapshots """
+    global _price_factors, _price_factors_version
+
+    with _price_factors_lock:
+        if _price_factors_version != version:
+            _price_factors = {}
+            _price_factors_version = version
+        _price_factors[key] = entry
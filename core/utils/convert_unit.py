@@ -1,18 +1,157 @@
-# ------- core/utils/convert_currency.py
- 
-from django.utils import timezone
-from core.enums.currency import Currency
-
-# Not yet implemented
-    
-def convert_system_unit(value, from_unit, to_unit):
-    """ Convert a value from one system unit to another for the same dimension. 
-    Raises:
-        - if either unit is a custom unit
-        - if the two system units have different dimensions
+# ------- core/utils/convert_unit.py
+
+from core.utils.convert_currency import PRICE_QUANTUM
+from decimal import Decimal as Dec, ROUND_HALF_UP
+from fractions import Fraction
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+from product.enums import SystemUnit
+
+_unit_index = None         # SystemUnit → (Dimension, index of the unit in the dimension's factor matrix)
+_factor_matrices = None    # Dimension → dense matrix of exact Decimal price factors, matrix[from index][to index]
+
+
+def convert_unit(value, from_unit=None, to_unit=None) -> Dec:
+    """ - Convert a price from one unit to another unit of the same dimension (eg: 10 €/kg → 0.01 €/g).
+    - Args:
+        - value: The price to convert.
+        - from_unit: The unit of the price: a SystemUnit, a system unit code, or a custom unit.
+        - to_unit: The unit to convert to: a SystemUnit, a system unit code, or a custom unit.
+    - Returns:
+        - The converted price, with 4 decimals, if both units are different
+        - The original price if to_unit is None, or if both units are the same.
+    - Raises:
+        - ValidationError: if either unit is not a system unit with a dimension, or if the units have different dimensions
     """
-    if from_unit == to_unit:
+    if to_unit is None or from_unit == to_unit:
         return value
-    else:
-        print("Warning: system unit conversion not implemented yet. Multiplying by 2 instead.")
-        return value * 2
+
+    return (Dec(value) * get_unit_factor(from_unit, to_unit)).quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def get_unit_factor(from_unit, to_unit) -> Dec:
+    """ Return the factor to multiply a price per from_unit by, to get the price per to_unit (one lookup in the precomputed matrices)
+    - Args:
+        - from_unit, to_unit: SystemUnit or system unit codes
+    - Returns:
+        - Decimal: factor of to_unit / factor of from_unit, both relative to the root unit of the dimension (see _resolve_base_units)
+    - Raises:
+        - ValidationError: if either unit is not a system unit with a dimension, or if the units have different dimensions
+    """
+    if _unit_index is None:
+        build_factor_matrices()
+
+    from_dimension, from_index = _get_unit_position(from_unit)
+    to_dimension, to_index = _get_unit_position(to_unit)
+    if from_dimension is not to_dimension:
+        raise ValidationError(_("Cannot convert %(from_unit)s to %(to_unit)s: the units have different dimensions"), params={'from_unit': from_unit, 'to_unit': to_unit})
+
+    return _factor_matrices[from_dimension][from_index][to_index]
+
+
+def get_unit_factors(to_unit) -> dict:
+    """ Return the factors to convert a price from each unit of the dimension of to_unit, to a price per to_unit (eg: for SQL conversions)
+    - Args:
+        - to_unit: SystemUnit or system unit code
+    - Returns:
+        - dict: SystemUnit → Decimal factor (see get_unit_factor), including to_unit itself (factor 1)
+    - Raises:
+        - ValidationError: if to_unit is not a system unit with a dimension
+    """
+    if _unit_index is None:
+        build_factor_matrices()
+
+    to_dimension, to_index = _get_unit_position(to_unit)
+    matrix = _factor_matrices[to_dimension]
+    return {unit: matrix[index][to_index] for unit, (dimension, index) in _unit_index.items() if dimension is to_dimension}
+
+
+def _validate_unit(unit) -> SystemUnit:
+    """ Return the SystemUnit matching the unit (or unit code) provided, or None if not provided """
+    if unit is None:
+        return None
+    system_unit = unit if isinstance(unit, SystemUnit) else SystemUnit.get_by_value(unit)
+    if system_unit is None:
+        raise ValidationError(_("Invalid unit: %(unit)s"), params={'unit': unit})
+    return system_unit
+
+
+def _get_unit_position(unit) -> tuple:
+    """ Return the (Dimension, matrix index) of a unit, or raise a ValidationError if it cannot be converted """
+    position = _unit_index.get(unit)
+    if position is None and isinstance(unit, str):
+        position = _unit_index.get(SystemUnit.get_by_value(unit))
+    if position is None:
+        raise ValidationError(_("Invalid unit for conversion: %(unit)s"), params={'unit': unit})
+    return position
+
+
+def build_factor_matrices():
+    """ Build, once per process, a dense matrix of the price factors between all the units of each dimension
+    - The factors are computed exactly (as fractions) and stored as Decimals, so conversions never go through floats
+    - Called at startup (see ProductConfig.ready), so that errors in the SystemUnit definitions are detected before any conversion
+    - Raises:
+        - ValidationError: if a base_unit chain is broken or circular, or if the units of a dimension do not share the same root unit
+    """
+    global _unit_index, _factor_matrices
+
+    base_units = _resolve_base_units()
+    units_by_dimension = {}
+    root_units = {}
+    for unit in SystemUnit:
+        if unit.dimension is None:  # units without a dimension (eg: age) cannot be converted
+            continue
+        root_unit = base_units[unit][0]
+        if root_units.setdefault(unit.dimension, root_unit) is not root_unit:
+            raise ValidationError(_("The units of dimension %(dimension)s have different root units: %(root_1)s and %(root_2)s"), params={'dimension': unit.dimension.label, 'root_1': root_units[unit.dimension], 'root_2': root_unit})
+        units_by_dimension.setdefault(unit.dimension, []).append(unit)
+
+    unit_index = {}
+    factor_matrices = {}
+    for dimension, units in units_by_dimension.items():
+        for index, unit in enumerate(units):
+            unit_index[unit] = (dimension, index)
+        factor_matrices[dimension] = [[_to_decimal(base_units[to_unit][1] / base_units[from_unit][1]) for to_unit in units] for from_unit in units]
+
+    _factor_matrices = factor_matrices
+    _unit_index = unit_index
+
+
+def _resolve_base_units(units=SystemUnit) -> dict:
+    """ Follow the base_unit chain of each SystemUnit up to its root unit (the unit which is its own base_unit), composing the factors along the way
+    - The factor of a unit is its units_to_base multiplied by the factors of the intermediate base units, if any.
+      Root units keep their own units_to_base (1, except GB_S whose factor is expressed like the other bandwidth units).
+    - Args:
+        - units: the enum of units to resolve (default: SystemUnit)
+    - Returns:
+        - dict: unit → (root unit, exact factor of the unit relative to the root, as a Fraction)
+    - Raises:
+        - ValidationError: if a base_unit is not a SystemUnit code, or if a chain is circular
+    """
+    units_by_code = {unit.value: unit for unit in units}
+    base_units = {}
+    for unit in units:
+        chain = [unit]
+        while chain[-1].base_unit != chain[-1].value:
+            base_unit = units_by_code.get(chain[-1].base_unit)
+            if base_unit is None:
+                raise ValidationError(_("Unknown base unit %(base_unit)s for unit %(unit)s"), params={'base_unit': chain[-1].base_unit, 'unit': chain[-1].name})
+            if base_unit in chain:
+                raise ValidationError(_("Circular base unit chain: %(chain)s"), params={'chain': ' → '.join(item.name for item in chain + [base_unit])})
+            chain.append(base_unit)
+
+        factor = _to_fraction(unit.units_to_base)
+        for base_unit in chain[1:-1]:
+            factor *= _to_fraction(base_unit.units_to_base)
+        base_units[unit] = (chain[-1], factor)
+    return base_units
+
+
+def _to_fraction(units_to_base) -> Fraction:
+    """ Return the exact value of a units_to_base as declared in the enum (eg: 0.100000001 → 100000001/1000000000, not the binary float) """
+    return Fraction(str(units_to_base))
+
+
+def _to_decimal(factor: Fraction) -> Dec:
+    """ Return a Fraction as a Decimal (exact for decimal factors, 28 significant digits otherwise) """
+    return Dec(factor.numerator) / Dec(factor.denominator)
@@ -0,0 +1,61 @@
+# ------- core/utils/fetch_exchange_rate.py
+
+from core.enums.currency import Currency
+from decimal import Decimal as Dec, InvalidOperation, ROUND_HALF_UP
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+from urllib.parse import urlencode
+from urllib.request import urlopen
+import json
+
+RATE_QUANTUM = Dec('0.000001')  # exchange rates are stored with 6 decimals (see Guidelines)
+
+
+def fetch_exchange_rate(currency: Currency) -> Dec:
+    """ Fetch the current rate of a currency to the Euro from the external API
+    - Args:
+        - currency (Currency): the currency to fetch the rate for
+    - Returns:
+        - Decimal: value of 1 unit of the currency in EUR, with 6 decimals
+    - Raises:
+        - ValidationError: if the API call fails or the response does not contain a valid rate
+    """
+    url = f"{settings.EXCHANGE_RATE_API_URL}?{urlencode({'from': currency.value, 'to': Currency.EUR.value})}"
+    try:
+        with urlopen(url, timeout=settings.EXCHANGE_RATE_API_TIMEOUT) as response:
+            data = json.loads(response.read(), parse_float=Dec)
+        rate = Dec(data['rates'][Currency.EUR.value])
+    except (OSError, ValueError, KeyError, TypeError, InvalidOperation) as error:  # URLError and timeouts are OSErrors
+        raise ValidationError(_("Could not fetch the exchange rate of %(currency)s: %(error)s"), params={'currency': currency.value, 'error': error}) from error
+
+    if rate <= 0:
+        raise ValidationError(_("Invalid exchange rate received for %(currency)s: %(rate)s"), params={'currency': currency.value, 'rate': rate})
+
+    return rate.quantize(RATE_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def fetch_exchange_rates() -> dict:
+    """ Fetch in a single API call the current rates to the Euro of all the currencies provided by the external API
+    - Returns:
+        - dict: Currency → value of 1 unit of the currency in EUR, with 6 decimals. Currencies unknown to the Currency enum are ignored.
+    - Raises:
+        - ValidationError: if the API call fails or the response does not contain valid rates
+    """
+    url = f"{settings.EXCHANGE_RATE_API_URL}?{urlencode({'from': Currency.EUR.value})}"
+    try:
+        with urlopen(url, timeout=settings.EXCHANGE_RATE_API_TIMEOUT) as response:
+            data = json.loads(response.read(), parse_float=Dec)
+        euro_rates = {code: Dec(euro_rate) for code, euro_rate in data['rates'].items()}  # 1 EUR = euro_rate units of the currency
+    except (OSError, ValueError, KeyError, TypeError, AttributeError, InvalidOperation) as error:
+        raise ValidationError(_("Could not fetch the exchange rates: %(error)s"), params={'error': error}) from error
+
+    rates = {}
+    for code, euro_rate in euro_rates.items():
+        currency = Currency.get_by_value(code)
+        if currency is None or euro_rate <= 0:
+            continue
+        rate = (1 / euro_rate).quantize(RATE_QUANTUM, rounding=ROUND_HALF_UP)
+        if rate > 0:  # rates below 0.0000005 EUR cannot be stored with 6 decimals
+            rates[currency] = rate
+    return rates
@@ -0,0 +1,117 @@
+# ------- core/utils/rate_cache.py
+
+from datetime import timedelta
+from django.utils import timezone
+import threading
+
+RATE_VALIDITY = timedelta(hours=24)  # a stored rate older than this must be fetched again from the external API
+
+
+class RateCache:
+    """ Process-local cache of the latest exchange rate of each currency, placed in front of the ExchangeRate model
+      - Description:
+          - each entry holds the rate and the datetime it was fetched at, and expires exactly when the stored ExchangeRate becomes stale (fetch datetime + validity)
+          - a warm process can therefore answer conversions without querying the database
+          - hits and misses are counted, so that the cache efficiency can be checked in production
+          - the version is incremented each time a rate is stored or removed, so that values derived from the rates (eg: fused price factors) can detect a new snapshot
+          - failed fetches are remembered until a retry datetime, so that a failing currency does not call the external API on each conversion
+          - the last bulk refresh (its datetime and the currencies provided by the bulk API) is remembered, so that it is not repeated on each database miss
+      - Attributes:
+          - validity (timedelta): how long a rate stays valid after being fetched (default: RATE_VALIDITY)
+          - hits (int): number of lookups answered by the cache
+          - misses (int): number of lookups not found in the cache, or expired
+          - version (int): incremented on each change of the cached rates
+          - bulk_refresh (tuple): (datetime of the last bulk refresh attempt, frozenset of the currencies provided by the bulk API, or None if it failed), None if none
+      - Methods:
+          - get, get_expiry, set, get_failure, set_failure, invalidate, stats, reset_stats
+    """
+    def __init__(self, validity: timedelta = RATE_VALIDITY):
+        self.validity = validity
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self.bulk_refresh = None
+        self._rates = {}  # currency → (rate, fetched_datetime, expiry_datetime)
+        self._failures = {}  # currency → (ValidationError, retry_datetime)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rates)
+
+    def get(self, currency, now=None):
+        """ Return the cached rate of a currency, or None if it is not cached or has expired (expired entries are evicted)
+          - Args:
+              - currency (Currency): the currency to look up
+              - now (datetime, optional): the reference time, defaults to timezone.now()
+          - Returns:
+              - Decimal: the cached rate, or None
+        """
+        entry = self._rates.get(currency)
+        with self._lock:
+            if entry is not None:
+                rate, fetched_datetime, expiry_datetime = entry
+                if (now or timezone.now()) < expiry_datetime:
+                    self.hits += 1
+                    return rate
+                if self._rates.get(currency) is entry:
+                    del self._rates[currency]
+                    self.version += 1
+            self.misses += 1
+        return None
+
+    def get_expiry(self, currency):
+        """ Return the datetime at which the cached rate of a currency expires, or None if it is not cached (no counters updated) """
+        entry = self._rates.get(currency)
+        return None if entry is None else entry[2]
+
+    def set(self, currency, rate, fetched_datetime):
+        """ Store the rate of a currency, fetched at the given datetime. The entry expires at fetched_datetime + validity. """
+        with self._lock:
+            self._rates[currency] = (rate, fetched_datetime, fetched_datetime + self.validity)
+            self.version += 1
+
+    def get_failure(self, currency, now=None):
+        """ Return the error of the last failed fetch of a currency, if it must not be retried yet, or None (expired failures are evicted) """
+        entry = self._failures.get(currency)
+        if entry is None:
+            return None
+        error, retry_datetime = entry
+        if (now or timezone.now()) < retry_datetime:
+            return error
+        self._failures.pop(currency, None)
+        return None
+
+    def set_failure(self, currency, error, retry_datetime):
+        """ Remember that the rate of a currency could not be fetched, until the retry datetime """
+        self._failures[currency] = (error, retry_datetime)
+
+    def invalidate(self, currency=None):
+        """ Remove one currency (its rate and failure) from the cache, or all of them and the last bulk refresh if no currency is provided """
+        with self._lock:
+            if currency is None:
+                self._rates.clear()
+                self._failures.clear()
+                self.bulk_refresh = None
+            else:
+                self._rates.pop(currency, None)
+                self._failures.pop(currency, None)
+            self.version += 1
+
+    def stats(self) -> dict:
+        """ Return the hit/miss counters, the hit ratio and the number of cached currencies """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'size': len(self._rates),
+        }
+
+    def reset_stats(self):
+        """ Reset the hit/miss counters to 0 """
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+rate_cache = RateCache()  # shared by all the conversions of the current process
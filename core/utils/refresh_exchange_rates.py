@@ -0,0 +1,76 @@
+# ------- core/utils/refresh_exchange_rates.py
+
+from core.enums.currency import Currency
+from core.models.exchange_rate import ExchangeRate
+from core.utils.fetch_exchange_rate import fetch_exchange_rates
+from core.utils.rate_cache import RATE_VALIDITY, rate_cache
+from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+BULK_REFRESH_INTERVAL = timedelta(minutes=10)  # a bulk refresh is not attempted again before this delay, even if some currencies are still stale
+
+
+def get_active_currencies() -> list:
+    """ Return the active currencies (is_active == 'True'), except the Euro which is the base currency (rate always 1) """
+    return [currency for currency in Currency if currency.is_active == 'True' and currency != Currency.EUR]
+
+
+def get_fresh_currencies() -> set:
+    """ Return the currencies with an ExchangeRate of less than 24 hours in the database """
+    return set(ExchangeRate.objects
+        .filter(datetime__gte=timezone.now() - RATE_VALIDITY)
+        .values_list('currency', flat=True)
+        .distinct())
+
+
+def count_stale_currencies() -> int:
+    """ Return the number of active currencies without an ExchangeRate of less than 24 hours in the database
+    - Once a bulk refresh has succeeded, only the currencies provided by the bulk API are counted: the others cannot be refreshed in bulk
+    """
+    currencies = get_active_currencies()
+    if rate_cache.bulk_refresh is not None and rate_cache.bulk_refresh[1] is not None:
+        currencies = [currency for currency in currencies if currency in rate_cache.bulk_refresh[1]]
+    fresh_currencies = get_fresh_currencies()
+    return sum(1 for currency in currencies if currency not in fresh_currencies)
+
+
+def is_bulk_refresh_due(now=None) -> bool:
+    """ Return True if no bulk refresh was attempted in this process in the last BULK_REFRESH_INTERVAL """
+    return rate_cache.bulk_refresh is None or (now or timezone.now()) - rate_cache.bulk_refresh[0] >= BULK_REFRESH_INTERVAL
+
+
+def is_provided_by_bulk_api(currency: Currency) -> bool:
+    """ Return False if the last successful bulk refresh did not provide the currency, True otherwise (or if unknown) """
+    return rate_cache.bulk_refresh is None or rate_cache.bulk_refresh[1] is None or currency in rate_cache.bulk_refresh[1]
+
+
+def refresh_exchange_rates() -> dict:
+    """ Refresh the rates of all the active currencies with one API call and one bulk insert
+    - Description:
+        - fetches all the rates to the Euro in a single API call
+        - stores one new ExchangeRate per active currency provided by the API, except those with a rate of less than 24 hours, with a single bulk_create
+        - stores the new rates in the process-local rate cache, and remembers the refresh and the currencies provided (see rate_cache.bulk_refresh)
+    - Returns:
+        - dict: Currency → rate, for the currencies refreshed
+    - Raises:
+        - ValidationError: if the API call fails
+    """
+    now = timezone.now()
+    try:
+        fetched_rates = fetch_exchange_rates()
+    except ValidationError:
+        rate_cache.bulk_refresh = (now, None)
+        raise
+    rate_cache.bulk_refresh = (now, frozenset(fetched_rates))
+
+    fresh_currencies = get_fresh_currencies()
+    exchange_rates = ExchangeRate.objects.bulk_create([
+        ExchangeRate(currency=currency, rate=fetched_rates[currency])
+        for currency in get_active_currencies() if currency in fetched_rates and currency not in fresh_currencies
+    ])
+
+    for exchange_rate in exchange_rates:
+        rate_cache.set(exchange_rate.currency, exchange_rate.rate, exchange_rate.datetime)
+
+    return {exchange_rate.currency: exchange_rate.rate for exchange_rate in exchange_rates}
@@ -1,19 +1,19 @@
 
 """ Shows differences between two texts with changes highlighted. Two version are provided:
     - show_differences_combined: Returns a single string with changes highlighted, containing extracts from both text1 and text2.
-    - show_differences_separate: Returns two strings with changes highlighted separately, one containing extracts from text1 and the other from text2. """
+    - show_differences_separate: Returns two strings with changes highlighted separately, one containing extracts from text1 and the other from text2.
+    Long texts are compared on their differing part only (see _diff_words), and replaced by a coarse summary when this part is too long to be compared word by word. """
 
-def show_differences_combined(text1, text2):
-    import difflib
+import difflib
+
+MAX_DIFF_WORDS = 5000  # above this number of differing words in both texts (common start and end excluded), the changes are summarized instead of compared word by word
+SUMMARY_WORDS = 5  # number of words kept at the start of a summarized change
 
+def show_differences_combined(text1, text2):
     if text1 == text2:
         return ''
 
-    words1 = text1.split()
-    words2 = text2.split()
-
-    sm = difflib.SequenceMatcher(None, words1, words2)
-    opcodes = sm.get_opcodes()
+    words1, words2, opcodes = _diff_words(text1, text2)
 
     if len(words1) <= 10 or len(words2) <= 10:
         # Return full text with changes highlighted
@@ -84,16 +84,10 @@ def show_differences_combined(text1, text2):
         return ' '.join(final_result_words)
 
 def show_differences_separate(text1, text2):
-    import difflib
-
     if text1 == text2:
         return ['', '']
 
-    words1 = text1.split()
-    words2 = text2.split()
-
-    sm = difflib.SequenceMatcher(None, words1, words2)
-    opcodes = sm.get_opcodes()
+    words1, words2, opcodes = _diff_words(text1, text2)
 
     if len(words1) <= 10 or len(words2) <= 10:
         # Return full texts with changes highlighted separately
@@ -187,6 +181,53 @@ def show_differences_separate(text1, text2):
 
         return [' '.join(final_result_words1), ' '.join(final_result_words2)]
 
+def _diff_words(text1, text2):
+    """ Split both texts into words and return (words1, words2, opcodes), the opcodes being those of difflib.SequenceMatcher.get_opcodes
+    - The common start and end of the texts are skipped, so only the differing part is compared, as integer ids (one per distinct word) rather than strings
+    - If the differing part has more than MAX_DIFF_WORDS words, it is not compared (quadratic in the worst case): it is replaced in both word lists
+      by a single summary word (its first words and its length), so the change is shown as one coarse replacement
+    """
+    words1 = text1.split()
+    words2 = text2.split()
+
+    prefix = 0
+    max_prefix = min(len(words1), len(words2))
+    while prefix < max_prefix and words1[prefix] == words2[prefix]:
+        prefix += 1
+    suffix = 0
+    max_suffix = max_prefix - prefix
+    while suffix < max_suffix and words1[-1 - suffix] == words2[-1 - suffix]:
+        suffix += 1
+    end1 = len(words1) - suffix
+    end2 = len(words2) - suffix
+
+    if (end1 - prefix) + (end2 - prefix) > MAX_DIFF_WORDS:
+        words1 = words1[:prefix] + _summarize(words1[prefix:end1]) + words1[end1:]
+        words2 = words2[:prefix] + _summarize(words2[prefix:end2]) + words2[end2:]
+        end1 = len(words1) - suffix
+        end2 = len(words2) - suffix
+        middle_opcodes = [('replace', 0, end1 - prefix, 0, end2 - prefix)] if end1 > prefix and end2 > prefix else \
+            [('delete' if end1 > prefix else 'insert', 0, end1 - prefix, 0, end2 - prefix)]
+    else:
+        word_ids = {}
+        ids1 = [word_ids.setdefault(word, len(word_ids)) for word in words1[prefix:end1]]
+        ids2 = [word_ids.setdefault(word, len(word_ids)) for word in words2[prefix:end2]]
+        middle_opcodes = difflib.SequenceMatcher(None, ids1, ids2, autojunk=True).get_opcodes() if ids1 or ids2 else []
+
+    opcodes = [('equal', 0, prefix, 0, prefix)] if prefix else []
+    opcodes.extend((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix) for tag, i1, i2, j1, j2 in middle_opcodes)
+    if suffix:
+        opcodes.append(('equal', end1, end1 + suffix, end2, end2 + suffix))
+    if not opcodes:
+        opcodes = [('equal', 0, 0, 0, 0)]
+    return words1, words2, opcodes
+
+def _summarize(words):
+    """ Return a long list of words as a list of one summary word: its first SUMMARY_WORDS words and its length (or an empty list if no words) """
+    if not words:
+        return []
+    return [' '.join(words[:SUMMARY_WORDS]) + f' ... ({len(words)} words)']
+
 def _get_diff_blocks(opcodes):
     # Identify blocks of differences considering proximity
     diff_blocks = []
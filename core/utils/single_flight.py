@@ -0,0 +1,92 @@
+# ------- core/utils/single_flight.py
+
+from asgiref.sync import sync_to_async
+import asyncio
+import threading
+
+
+class _Flight:
+    """ A call in progress: waiters block on `done` and then share the result (or the error) of the leader """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """ Coalesce concurrent calls for the same key, so that only one of them runs and all the others share its result
+      - Description:
+          - the first caller for a key (the leader) runs the function, the callers arriving while it runs wait for it and get the same result or error
+          - once the call is over, the key is released: the next caller starts a new call
+          - `do` coalesces threads (WSGI), `do_async` coalesces coroutines (ASGI) and joins the threads' calls as well
+      - Methods:
+          - do, do_async
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key → _Flight
+        self._futures = {}  # (event loop, key) → asyncio.Future
+        self._tasks = set()  # running call tasks, referenced until they are done (the event loop only keeps weak references)
+
+    def do(self, key, function, *args, **kwargs):
+        """ Run function(*args, **kwargs), unless a call for the same key is already running in another thread, in which case wait for its result
+          - Args:
+              - key: any hashable identifying the call (eg. a Currency)
+              - function: the function to run
+          - Returns:
+              - the result of the function, as returned to the leader
+          - Raises:
+              - the error raised by the function, in the leader and in all the waiters
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = _Flight()
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function(*args, **kwargs)
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def do_async(self, key, function, *args, **kwargs):
+        """ Async version of `do`: coroutines waiting for the same key await the leader's future instead of blocking a thread
+          - The sync function is run through sync_to_async (so the ORM can be used) and joins any call already running in a thread.
+          - The call runs in its own task: if the leader coroutine is cancelled (eg: the client disconnected), the call goes on for the other waiters.
+          - Args, Returns and Raises: see `do`
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._futures.get((loop, key))
+            if future is None:
+                future = self._futures[(loop, key)] = loop.create_future()
+                task = loop.create_task(sync_to_async(self.do)(key, function, *args, **kwargs))
+                self._tasks.add(task)
+                task.add_done_callback(lambda task: self._settle(loop, key, future, task))
+
+        return await asyncio.shield(future)
+
+    def _settle(self, loop, key, future, task):
+        """ Release the key, and pass the result (or the error) of the call task to the coroutines awaiting its future """
+        with self._lock:
+            del self._futures[(loop, key)]
+            self._tasks.discard(task)
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+            future.exception()  # mark the error as retrieved, in case no coroutine is waiting anymore
+        else:
+            future.set_result(task.result())
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class ProductConfig(AppConfig):
     name = "product"
+
+    def ready(self):
+        # Resolve the SystemUnit base unit chains at startup, to detect broken definitions before any conversion
+        from core.utils.convert_unit import build_factor_matrices
+        build_factor_matrices()
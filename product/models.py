@@ -3,15 +3,25 @@
 from core.enums.currency import Currency
 from core.enums.general import Focus, Visibility
 from core.enums.status import Status
+from core.models.exchange_rate import ExchangeRate
 from core.models.flexup_enum_field import FlexUpEnumField
 from core.models.flexup_model import FlexUpModel, get_current_member
+from core.models.log_changes import AuditedQuerySetMixin
+from core.utils.convert_currency import PRICE_QUANTUM, _validate_currency, get_exchange_rate
+from core.utils.convert_price import convert_price
+from core.utils.convert_unit import _validate_unit, get_unit_factors
+from core.utils.rate_cache import RATE_VALIDITY
 from decimal import Decimal as Dec, ROUND_HALF_UP
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from product.enums import ProductStatuses, SystemUnit, ProductVisibilities
 from typing import Optional
 from polymorphic.models import PolymorphicManager
+from polymorphic.query import PolymorphicQuerySet
 
 
 class AbstractProduct(FlexUpModel):
@@ -73,7 +83,7 @@ class AbstractProduct(FlexUpModel):
     def unit(self) -> str:
         """ Get the unit of measurement. """
         if self.system_unit:
-            return self.system_unit.symbol
+            return self.system_unit.translated('symbol')
         elif self.custom_unit:
             return self.custom_unit
         return ''  # in some cases, no unit is required (for example for funding) then don't display any unit
@@ -82,8 +92,8 @@ class AbstractProduct(FlexUpModel):
     def currency_with_unit(self) -> str:
         """ Get the currency symbol with the unit of measurement. """
         if self.unit:
-            return f"{self.currency.symbol}/{self.unit}"
-        return f"{self.currency.symbol}"
+            return f"{self.currency.translated('symbol')}/{self.unit}"
+        return f"{self.currency.translated('symbol')}"
 
     @property
     def price_info(self) -> str:
@@ -116,6 +126,75 @@ class AbstractProduct(FlexUpModel):
             raise ValidationError(_('Invalid tax rate'))
 
 
+class ProductQuerySet(AuditedQuerySetMixin, PolymorphicQuerySet):
+
+    def convert_price(self, target_currency: Currency, target_unit=None, batch_size: int = 1000) -> list:
+        """ Bulk version of Product.convert_price: create a converted copy of each product of the queryset
+        - The products are read and the copies inserted by chunks of batch_size (one query + one bulk_create per chunk), in a single transaction.
+          The rates & unit factors are shared by all the products with the same currency and unit (see core.utils.convert_price).
+        - Args:
+            - target_currency (Currency): the currency of the copies
+            - target_unit (SystemUnit, optional): the unit of the copies (default: the unit of each product)
+            - batch_size (int): the number of products read and inserted per query
+        - Returns:
+            - list of Product: the copies, with their new ids
+        - Raises:
+            - ValidationError: if a product price cannot be converted or does not fit in price_excluding_tax (nothing is created)
+        """
+        new_products = []
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))  # snapshot first: the copies must not be read back while iterating
+            for start in range(0, len(pks), batch_size):
+                chunk_pks = pks[start:start + batch_size]
+                products = self.model._default_manager.in_bulk(chunk_pks)
+                new_products += self.model._default_manager.bulk_create([
+                    products[pk].converted_copy(target_currency, target_unit) for pk in chunk_pks
+                ])
+        return new_products
+
+    def annotate_converted_price(self, target_currency: Currency, target_unit=None, name: str = 'converted_price') -> 'ProductQuerySet':
+        """ Annotate each product with its price converted to the target currency and unit, computed by the database
+        - So that the products can be filtered and ordered by converted price (eg: .filter(converted_price__lte=2).order_by('converted_price'))
+        - Description:
+            - the rate of each product currency is the latest ExchangeRate of less than 24 hours stored in the database (1 for EUR), as with get_exchange_rate
+            - the rate of the target currency is resolved once, with get_exchange_rate
+            - the unit factors are those of the SystemUnit conversion matrices (see core.utils.convert_unit)
+            - the converted price is NULL if it cannot be computed: no price, no valid stored rate for the product currency,
+              or a unit which cannot be converted to the target unit (custom unit, or different dimension)
+        - Args:
+            - target_currency (Currency): the currency to convert to
+            - target_unit (SystemUnit, optional): the unit to convert to (default: the prices are not converted to another unit)
+            - name (str): the name of the annotation
+        - Returns:
+            - ProductQuerySet: the annotated queryset, with the converted prices rounded to 4 decimals
+        - Raises:
+            - ValidationError: if target_currency or target_unit is not valid, or if the target rate cannot be fetched
+        """
+        output_field = models.DecimalField(max_digits=15, decimal_places=4)
+        target_currency = _validate_currency(target_currency, required=True)
+        latest_rate = ExchangeRate.objects\
+            .filter(currency=OuterRef('currency'), datetime__gte=timezone.now() - RATE_VALIDITY)\
+            .order_by('-datetime')\
+            .values('rate')[:1]
+        currency_factor = Case(
+            When(currency=Currency.EUR, then=Value(Dec(1))),
+            default=Subquery(latest_rate),
+            output_field=output_field,
+        ) / Value(get_exchange_rate(target_currency), output_field=output_field)
+
+        converted_price = F('price_excluding_tax') * currency_factor
+        if target_unit is not None:
+            unit_factors = get_unit_factors(target_unit)
+            unit_factor = Case(
+                *[When(system_unit=unit, then=Value(factor)) for unit, factor in unit_factors.items()],
+                default=None,
+                output_field=output_field,
+            )
+            converted_price = converted_price * unit_factor
+
+        return self.annotate(**{name: Round(converted_price, 4, output_field=output_field)})  # 4 decimals, as convert_price
+
+
 # class VisibleProductManager(PolymorphicManager):
 #     def get_queryset(self):
 #         current_member = get_current_member()
@@ -149,9 +228,52 @@ class Product(AbstractProduct):
     visibility = FlexUpEnumField(flexup_enum=Visibility, verbose_name=_("Visibility"), choices=ProductVisibilities, default=Visibility.PRIVATE)
     focus = FlexUpEnumField(flexup_enum=Focus, verbose_name=_("Focus"), choices=Focus.choices, default=Focus.NORMAL)
 
+    objects = PolymorphicManager.from_queryset(ProductQuerySet)()
     # visible = VisibleProductManager()
 
 # Methods
+    def convert_price(self, target_currency: Currency, target_unit=None) -> 'Product':
+        """ Create a copy of the product, with its price converted to the target currency and unit, and store it with a new id
+        - To convert many products, use Product.objects.filter(...).convert_price(...) which inserts the copies in bulk
+        - Args & Raises: see converted_copy
+        - Returns:
+            - Product: the new product
+        """
+        new_product = self.converted_copy(target_currency, target_unit)
+        new_product.save()
+        return new_product
+
+    def converted_copy(self, target_currency: Currency, target_unit=None) -> 'Product':
+        """ Return an unsaved copy of the product, with its price converted to the target currency and unit
+        - Args:
+            - target_currency (Currency): the currency of the copy
+            - target_unit (SystemUnit, optional): the unit of the copy (default: the unit of the product)
+        - Returns:
+            - Product: the copy, without id
+        - Raises:
+            - ValidationError: if target_currency or target_unit is not valid, if the price cannot be converted (see core.utils.convert_price),
+              or if the converted price does not fit in price_excluding_tax (the copies of ProductQuerySet.convert_price are not cleaned)
+        """
+        from_unit = self.system_unit or self.custom_unit
+        target_currency = _validate_currency(target_currency)  # validated even without price, as the currency of the copy
+        change_unit = target_unit is not None and target_unit != from_unit
+        if change_unit:  # convert_price only accepts system units for a change of unit
+            target_unit = _validate_unit(target_unit)
+        new_product = self.__class__(**{
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields if not field.primary_key
+        })
+        if self.price_excluding_tax is not None:
+            price = convert_price(self.price_excluding_tax, self.currency, target_currency, from_unit, target_unit)
+            new_product.price_excluding_tax = Dec(price).quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+            self._meta.get_field('price_excluding_tax').run_validators(new_product.price_excluding_tax)  # max_digits
+        if target_currency is not None:
+            new_product.currency = target_currency
+        if change_unit:
+            new_product.system_unit = target_unit
+            new_product.custom_unit = None
+        return new_product
+
     def duplicate(self):
         new_product = self
         new_product.name = f"{self.name} (copy)"
@@ -170,7 +292,7 @@ class Product(AbstractProduct):
             if label:
                 label += ", "
             label += self.price_info
-        label += f" {self.visibility.symbol}{self.status.symbol}"
+        label += f" {self.visibility.translated('symbol')}{self.status.translated('symbol')}"
         
         # if current_member and current_member.account == self.account:
         #     label += f"{self.focus.symbol}"
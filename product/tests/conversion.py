@@ -1,6 +1,460 @@
 from product.enums import SystemUnit
 from core.enums.currency import Currency
+from core.models.exchange_rate import ExchangeRate
+from core.utils.convert_currency import FETCH_RETRY_DELAY, aconvert_currency, convert_currencies, convert_currency
+from core.models.flexup_enum import FlexUpEnum
+from core.utils.convert_price import convert_price
+from core.utils.convert_unit import _resolve_base_units, convert_unit, get_unit_factor
+from core.utils.rate_cache import rate_cache
+from core.utils.refresh_exchange_rates import refresh_exchange_rates
+from datetime import timedelta
+from decimal import Decimal as Dec
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from fractions import Fraction
+from freezegun import freeze_time
 from product.models import Product
+from unittest import skipIf
+from unittest.mock import patch
+import asyncio
+import time
 
-        
-    # to be completed by the candidate
+from utils.print_object import _print_object
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FETCHED_RATES = {Currency.USD: Dec('0.850000'), Currency.JPY: Dec('0.007874')}
+
+
+def fake_fetch_exchange_rate(currency):
+    return FETCHED_RATES[currency]
+
+
+@override_settings(EXCHANGE_RATE_BULK_THRESHOLD=1000)  # per currency fetches, see BulkRefreshTest for the bulk refresh
+@patch('core.utils.convert_currency.fetch_exchange_rate', side_effect=fake_fetch_exchange_rate)
+class ConvertCurrencyTest(TestCase):
+
+    def setUp(self):
+        rate_cache.invalidate()
+        rate_cache.reset_stats()
+
+    def test_01_same_or_missing_currency(self, fetch):
+        _print_object(print_function_name=True)
+        # When the target currency is missing or identical to the source currency, the input price is returned
+        self.assertEqual(convert_currency(Dec('10.00'), Currency.USD), Dec('10.00'))
+        self.assertEqual(convert_currency(Dec('10.00'), Currency.USD, Currency.USD), Dec('10.00'))
+        fetch.assert_not_called()
+
+    def test_02_invalid_currencies(self, fetch):
+        _print_object(print_function_name=True)
+        # When the source currency is missing or either currency is invalid, an error is raised
+        with self.assertRaises(ValidationError):
+            convert_currency(Dec('10.00'), None, Currency.USD)
+        with self.assertRaises(ValidationError):
+            convert_currency(Dec('10.00'), 'XXX', Currency.USD)
+        with self.assertRaises(ValidationError):
+            convert_currency(Dec('10.00'), Currency.USD, 'XXX')
+
+    def test_03_rate_fetched_once_then_cached(self, fetch):
+        _print_object(print_function_name=True)
+        # Given no rate in the database
+        # When a price is converted from USD to EUR
+        price = convert_currency(Dec('100.00'), Currency.USD, Currency.EUR)
+        _print_object(price, label="100 USD in EUR")
+
+        # Then the rate is fetched once and stored in the database
+        self.assertEqual(price, Dec('85.0000'))
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(ExchangeRate.objects.filter(currency=Currency.USD).count(), 1)
+
+        # When converting again, the rate comes from the cache, without any database query
+        with self.assertNumQueries(0):
+            self.assertEqual(convert_currency(Dec('100.00'), Currency.EUR, Currency.USD), Dec('117.6471'))
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(rate_cache.hits, 1)
+
+    def test_04_rate_from_database_then_refreshed_when_stale(self, fetch):
+        _print_object(print_function_name=True)
+        # Given a recent rate stored in the database
+        ExchangeRate.objects.create(currency=Currency.JPY, rate=Dec('0.007000'))
+
+        # When a price is converted, the stored rate is used
+        self.assertEqual(convert_currency(Dec('1000'), Currency.JPY, Currency.EUR), Dec('7.0000'))
+        fetch.assert_not_called()
+
+        # When the rate is more than 24 hours old, a new rate is fetched
+        with freeze_time(timezone.now() + timedelta(hours=25)):
+            self.assertEqual(convert_currency(Dec('1000'), Currency.JPY, Currency.EUR), Dec('7.8740'))
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(ExchangeRate.objects.filter(currency=Currency.JPY).count(), 2)
+
+    def test_05_batch_conversion(self, fetch):
+        _print_object(print_function_name=True)
+        # Given a list of prices in different currencies
+        prices = [Dec('100.00'), Dec('1000'), Dec('50.00'), Dec('20.00')] * 100
+        from_currencies = [Currency.USD, Currency.JPY, Currency.EUR, Currency.USD] * 100
+
+        # When they are all converted to EUR in one batch
+        converted = convert_currencies(prices, from_currencies, Currency.EUR)
+
+        # Then each rate is fetched only once, and the results are in the input order and identical to the scalar conversion
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(converted[:4], [Dec('85.0000'), Dec('7.8740'), Dec('50.00'), Dec('17.0000')])
+        self.assertEqual(converted, [convert_currency(p, c, Currency.EUR) for p, c in zip(prices, from_currencies)])
+
+        # And sequences of different lengths are rejected
+        with self.assertRaises(ValidationError):
+            convert_currencies(prices, from_currencies[:3], Currency.EUR)
+
+    @skipIf(numpy is None, "numpy is not installed")
+    def test_06_batch_conversion_with_numpy(self, fetch):
+        _print_object(print_function_name=True)
+        converted = convert_currencies([100, 1000], [Currency.USD, Currency.JPY], Currency.EUR, use_numpy=True)
+        self.assertEqual(converted.tolist(), [85.0, 7.874])
+
+    def test_07_fetch_failure(self, fetch):
+        _print_object(print_function_name=True)
+        # When the external API fails, an error is raised and nothing is stored
+        fetch.side_effect = ValidationError("API unavailable")
+        with self.assertRaises(ValidationError):
+            convert_currency(Dec('10.00'), Currency.USD, Currency.EUR)
+        self.assertEqual(ExchangeRate.objects.count(), 0)
+
+    def test_08_fetch_failure_not_retried_at_once(self, fetch):
+        _print_object(print_function_name=True)
+        # Given a failed fetch of the USD rate
+        fetch.side_effect = ValidationError("API unavailable")
+        with self.assertRaises(ValidationError):
+            convert_currency(Dec('10.00'), Currency.USD, Currency.EUR)
+
+        # When converting again, the error is raised without calling the API again
+        with self.assertRaises(ValidationError):
+            convert_currency(Dec('10.00'), Currency.USD, Currency.EUR)
+        self.assertEqual(fetch.call_count, 1)
+
+        # When the retry delay is over, the rate is fetched again
+        fetch.side_effect = fake_fetch_exchange_rate
+        with freeze_time(timezone.now() + FETCH_RETRY_DELAY):
+            self.assertEqual(convert_currency(Dec('10.00'), Currency.USD, Currency.EUR), Dec('8.5000'))
+        self.assertEqual(fetch.call_count, 2)
+
+    async def test_09_async_conversions_share_one_fetch(self, fetch):
+        _print_object(print_function_name=True)
+        # Given a slow API
+        def slow_fetch_exchange_rate(currency):
+            time.sleep(0.05)
+            return fake_fetch_exchange_rate(currency)
+        fetch.side_effect = slow_fetch_exchange_rate
+
+        # When 10 coroutines convert USD prices at the same time
+        prices = await asyncio.gather(*[aconvert_currency(Dec('100.00'), Currency.USD, Currency.EUR) for _ in range(10)])
+
+        # Then the rate is fetched once, and shared by all the coroutines
+        self.assertEqual(prices, [Dec('85.0000')] * 10)
+        self.assertEqual(fetch.call_count, 1)
+
+
+@patch('core.utils.refresh_exchange_rates.fetch_exchange_rates', return_value=FETCHED_RATES)
+@patch('core.utils.convert_currency.fetch_exchange_rate', side_effect=fake_fetch_exchange_rate)
+class BulkRefreshTest(TestCase):
+
+    def setUp(self):
+        rate_cache.invalidate()
+
+    def test_01_refresh_all_rates_at_once(self, fetch, fetch_all):
+        _print_object(print_function_name=True)
+        # When all the rates are refreshed, they are fetched in one call and inserted in one query (after reading the fresh currencies)
+        with self.assertNumQueries(2):
+            refreshed_rates = refresh_exchange_rates()
+
+        # Then all the active currencies provided by the API are stored, and cached
+        self.assertEqual(refreshed_rates, FETCHED_RATES)
+        self.assertEqual(ExchangeRate.objects.count(), 2)
+        self.assertEqual(rate_cache.get(Currency.JPY), Dec('0.007874'))
+
+    @override_settings(EXCHANGE_RATE_BULK_THRESHOLD=10)
+    def test_02_bulk_refresh_when_too_many_stale_currencies(self, fetch, fetch_all):
+        _print_object(print_function_name=True)
+        # Given no rate in the database (all currencies are stale)
+        # When a price is converted, all the rates are refreshed at once instead of fetching the single rate
+        self.assertEqual(convert_currency(Dec('100.00'), Currency.USD, Currency.JPY), Dec('10795.0216'))
+        self.assertEqual(fetch_all.call_count, 1)
+        fetch.assert_not_called()
+
+    @override_settings(EXCHANGE_RATE_BULK_THRESHOLD=1)
+    def test_03_bulk_refresh_not_repeated(self, fetch, fetch_all):
+        _print_object(print_function_name=True)
+        # Given a bulk refresh, triggered by a conversion from USD, which does not provide GBP
+        self.assertEqual(convert_currency(Dec('100.00'), Currency.USD, Currency.EUR), Dec('85.0000'))
+        self.assertEqual(fetch_all.call_count, 1)
+
+        # When GBP prices are converted several times
+        for _ in range(3):
+            with self.assertRaises(ValidationError):
+                convert_currency(Dec('100.00'), Currency.GBP, Currency.EUR)
+
+        # Then the bulk refresh is not repeated, GBP is not fetched, and only the rates provided are stored
+        self.assertEqual(fetch_all.call_count, 1)
+        fetch.assert_not_called()
+        self.assertEqual(ExchangeRate.objects.count(), 2)
+
+    def test_04_fresh_rates_not_refreshed(self, fetch, fetch_all):
+        _print_object(print_function_name=True)
+        # Given a recent USD rate in the database
+        ExchangeRate.objects.create(currency=Currency.USD, rate=Dec('0.840000'))
+
+        # When all the rates are refreshed, only the stale ones are stored
+        self.assertEqual(refresh_exchange_rates(), {Currency.JPY: Dec('0.007874')})
+        self.assertEqual(ExchangeRate.objects.filter(currency=Currency.USD).count(), 1)
+
+
+class ConvertUnitTest(TestCase):
+
+    def test_01_same_or_missing_unit(self):
+        _print_object(print_function_name=True)
+        # When the target unit is missing or identical to the source unit, the input price is returned
+        self.assertEqual(convert_unit(Dec('10.00'), SystemUnit.KG), Dec('10.00'))
+        self.assertEqual(convert_unit(Dec('10.00'), SystemUnit.KG, SystemUnit.KG), Dec('10.00'))
+        self.assertEqual(convert_unit(Dec('10.00'), 'portion', 'portion'), Dec('10.00'))
+
+    def test_02_units_of_the_same_dimension(self):
+        _print_object(print_function_name=True)
+        # When a price per kg is converted to a price per g or per ton
+        self.assertEqual(convert_unit(Dec('10.00'), SystemUnit.KG, SystemUnit.GRAM), Dec('0.0100'))
+        self.assertEqual(convert_unit(Dec('10.00'), SystemUnit.KG, SystemUnit.TON), Dec('10000.0000'))
+
+        # When a price per hour is converted to a price per day, using the unit codes
+        self.assertEqual(convert_unit(Dec('10.00'), 'HR', 'DAY'), Dec('240.0000'))
+
+    def test_03_invalid_units(self):
+        _print_object(print_function_name=True)
+        # When the units have different dimensions, an error is raised
+        with self.assertRaises(ValidationError):
+            convert_unit(Dec('10.00'), SystemUnit.KG, SystemUnit.LIT)
+
+        # When either unit is a custom unit, or has no dimension, an error is raised
+        with self.assertRaises(ValidationError):
+            convert_unit(Dec('10.00'), SystemUnit.KG, 'portion')
+        with self.assertRaises(ValidationError):
+            convert_unit(Dec('10.00'), 'portion', SystemUnit.KG)
+        with self.assertRaises(ValidationError):
+            convert_unit(Dec('10.00'), SystemUnit.AGE_MO, SystemUnit.AGE_YR)
+
+    def test_04_base_unit_chains(self):
+        _print_object(print_function_name=True)
+        # Given units whose base unit is not the root of the dimension
+        class ChainedUnit(FlexUpEnum):
+            label: str
+            base_unit: str
+            units_to_base: float
+
+            # name    value   label       base_unit  units_to_base
+            SECOND  = 'SEC',  'Second',   'MIN',     1 / 60
+            MINUTE  = 'MIN',  'Minute',   'HR',      1 / 60
+            HOUR    = 'HR',   'Hour',     'HR',      1
+
+        # Then the chains are followed to the root unit, and the factors composed
+        base_units = _resolve_base_units(ChainedUnit)
+        self.assertIs(base_units[ChainedUnit.SECOND][0], ChainedUnit.HOUR)
+        self.assertEqual(base_units[ChainedUnit.SECOND][1], Fraction(str(1 / 60)) ** 2)
+
+    def test_05_broken_base_unit_chains(self):
+        _print_object(print_function_name=True)
+        # Given units with a circular chain, or a base unit which does not exist, an error is raised
+        class CircularUnit(FlexUpEnum):
+            label: str
+            base_unit: str
+            units_to_base: float
+
+            # name    value   label       base_unit  units_to_base
+            ONE     = 'ONE',  'One',      'TWO',     2
+            TWO     = 'TWO',  'Two',      'ONE',     0.5
+
+        class DanglingUnit(FlexUpEnum):
+            label: str
+            base_unit: str
+            units_to_base: float
+
+            # name    value   label       base_unit  units_to_base
+            ONE     = 'ONE',  'One',      'XXX',     2
+
+        with self.assertRaises(ValidationError):
+            _resolve_base_units(CircularUnit)
+        with self.assertRaises(ValidationError):
+            _resolve_base_units(DanglingUnit)
+
+    def test_06_exact_factors(self):
+        _print_object(print_function_name=True)
+        # The factors are exact Decimals computed from the declared units_to_base, without float rounding
+        self.assertEqual(get_unit_factor(SystemUnit.KG, SystemUnit.GRAM), Dec('0.001'))
+        self.assertEqual(get_unit_factor(SystemUnit.LIT, SystemUnit.DL), Dec('0.100000001'))
+        self.assertEqual(get_unit_factor(SystemUnit.DL, SystemUnit.CL), Dec('0.01') / Dec('0.100000001'))
+
+        # Then a conversion followed by the reverse conversion gives back the original price
+        self.assertEqual(convert_unit(convert_unit(Dec('1000.00'), SystemUnit.LIT, SystemUnit.CL), SystemUnit.CL, SystemUnit.LIT), Dec('1000.0000'))
+
+
+@override_settings(EXCHANGE_RATE_BULK_THRESHOLD=1000)
+@patch('core.utils.convert_currency.fetch_exchange_rate', side_effect=fake_fetch_exchange_rate)
+class ConvertPriceTest(TestCase):
+
+    def setUp(self):
+        rate_cache.invalidate()
+
+    def test_01_currency_and_unit(self, fetch):
+        _print_object(print_function_name=True)
+        # When a price per kg in EUR is converted to a price per g in USD
+        self.assertEqual(convert_price(Dec('85.00'), Currency.EUR, Currency.USD, SystemUnit.KG, SystemUnit.GRAM), Dec('0.1000'))
+
+        # When only the unit or only the currency changes
+        self.assertEqual(convert_price(Dec('10.00'), Currency.EUR, Currency.EUR, SystemUnit.KG, SystemUnit.GRAM), Dec('0.0100'))
+        self.assertEqual(convert_price(Dec('100.00'), Currency.USD, Currency.EUR, SystemUnit.KG), Dec('85.0000'))
+
+    def test_02_fused_factor_cached_until_rates_change(self, fetch):
+        _print_object(print_function_name=True)
+        # Given a first conversion, which fetches the rate
+        self.assertEqual(convert_price(Dec('100.00'), Currency.USD, Currency.EUR, SystemUnit.KG, SystemUnit.GRAM), Dec('0.0850'))
+
+        # When the same currencies & units are converted again, the cached factor is used, without any query or rate lookup
+        rate_cache.reset_stats()
+        with self.assertNumQueries(0):
+            self.assertEqual(convert_price(Dec('200.00'), Currency.USD, Currency.EUR, SystemUnit.KG, SystemUnit.GRAM), Dec('0.1700'))
+        self.assertEqual(rate_cache.stats()['hits'] + rate_cache.stats()['misses'], 0)
+
+        # When a new rate is stored, the factor is recomputed
+        rate_cache.set(Currency.USD, Dec('0.900000'), timezone.now())
+        self.assertEqual(convert_price(Dec('100.00'), Currency.USD, Currency.EUR, SystemUnit.KG, SystemUnit.GRAM), Dec('0.0900'))
+
+        # When the rate expires, it is fetched again
+        with freeze_time(timezone.now() + timedelta(hours=25)):
+            self.assertEqual(convert_price(Dec('100.00'), Currency.USD, Currency.EUR, SystemUnit.KG, SystemUnit.GRAM), Dec('0.0850'))
+        self.assertEqual(fetch.call_count, 2)
+
+
+@override_settings(EXCHANGE_RATE_BULK_THRESHOLD=1000)
+@patch('core.utils.convert_currency.fetch_exchange_rate', side_effect=fake_fetch_exchange_rate)
+class ProductConvertPriceTest(TestCase):
+
+    def setUp(self):
+        rate_cache.invalidate()
+        self.potatoes = Product.objects.create(name="Potatoes", price_excluding_tax=Dec('100.00'), tax_rate=Dec('5.50'), currency=Currency.USD, system_unit=SystemUnit.KG)
+
+    def test_01_convert_one_product(self, fetch):
+        _print_object(print_function_name=True)
+        # When a product is converted to another currency and unit
+        converted = self.potatoes.convert_price(Currency.EUR, SystemUnit.GRAM)
+        _print_object(converted, label="Converted product")
+
+        # Then a new product is stored, with the converted price, currency and unit, and the other fields copied
+        self.assertNotEqual(converted.pk, self.potatoes.pk)
+        self.assertEqual(Product.objects.count(), 2)
+        converted.refresh_from_db()
+        self.assertEqual(converted.price_excluding_tax, Dec('0.0850'))
+        self.assertEqual(converted.currency, Currency.EUR)
+        self.assertEqual(converted.system_unit, SystemUnit.GRAM)
+        self.assertEqual((converted.name, converted.tax_rate), ("Potatoes", Dec('5.50')))
+
+        # And the original product is unchanged
+        self.potatoes.refresh_from_db()
+        self.assertEqual((self.potatoes.price_excluding_tax, self.potatoes.currency), (Dec('100.00'), Currency.USD))
+
+    def test_02_convert_custom_unit_product(self, fetch):
+        _print_object(print_function_name=True)
+        # When a product with a custom unit is converted to another currency only, its unit is kept
+        cake = Product.objects.create(name="Cake", price_excluding_tax=Dec('5.00'), currency=Currency.EUR, custom_unit="portion")
+        converted = cake.convert_price(Currency.USD)
+        self.assertEqual((converted.price_excluding_tax, converted.custom_unit), (Dec('5.8824'), "portion"))
+
+        # When it is converted to a system unit, an error is raised
+        with self.assertRaises(ValidationError):
+            cake.convert_price(Currency.USD, SystemUnit.KG)
+
+    def test_03_convert_queryset(self, fetch):
+        _print_object(print_function_name=True)
+        # Given several products in different currencies
+        Product.objects.create(name="Rice", price_excluding_tax=Dec('1000'), currency=Currency.JPY, system_unit=SystemUnit.KG)
+        Product.objects.create(name="Flour", price_excluding_tax=Dec('2.00'), currency=Currency.EUR, system_unit=SystemUnit.KG)
+
+        # When the whole queryset is converted, the copies are inserted in bulk
+        # (savepoint, product ids, 2 chunks x (select + bulk insert), 2 rates x (select, stale count, insert), release)
+        with self.assertNumQueries(13):
+            converted = Product.objects.order_by('pk').convert_price(Currency.EUR, SystemUnit.GRAM, batch_size=2)
+
+        # Then each copy has its price converted, in the queryset order
+        self.assertEqual(Product.objects.count(), 6)
+        self.assertEqual([product.price_excluding_tax for product in converted], [Dec('0.0850'), Dec('0.0079'), Dec('0.0020')])
+        self.assertTrue(all(product.pk for product in converted))
+        self.assertEqual(Product.objects.filter(system_unit=SystemUnit.GRAM, currency=Currency.EUR).count(), 3)
+
+        # And when a price cannot be converted, nothing is created
+        Product.objects.create(name="Cake", price_excluding_tax=Dec('5.00'), currency=Currency.EUR, custom_unit="portion")
+        with self.assertRaises(ValidationError):
+            Product.objects.all().convert_price(Currency.EUR, SystemUnit.GRAM)
+        self.assertEqual(Product.objects.count(), 7)
+
+    def test_04_annotate_converted_price(self, fetch):
+        _print_object(print_function_name=True)
+        # Given products in different currencies and units, and the rates stored in the database
+        ExchangeRate.objects.create(currency=Currency.USD, rate=Dec('0.850000'))
+        ExchangeRate.objects.create(currency=Currency.JPY, rate=Dec('0.007874'))
+        Product.objects.create(name="Rice", price_excluding_tax=Dec('1000'), currency=Currency.JPY, system_unit=SystemUnit.GRAM)
+        Product.objects.create(name="Flour", price_excluding_tax=Dec('2.00'), currency=Currency.EUR, system_unit=SystemUnit.KG)
+        Product.objects.create(name="Cake", price_excluding_tax=Dec('5.00'), currency=Currency.EUR, custom_unit="portion")
+
+        # When the products are annotated with their price in EUR per kg, and ordered by it
+        products = Product.objects.annotate_converted_price(Currency.EUR, SystemUnit.KG).order_by(F('converted_price').asc(nulls_last=True))
+        prices = [(product.name, product.converted_price) for product in products]
+        _print_object(prices, label="Prices in EUR/kg")
+
+        # Then the prices are converted by the database, as with convert_price, and NULL when they cannot be converted
+        self.assertEqual(prices, [("Flour", Dec('2.0000')), ("Potatoes", Dec('85.0000')), ("Rice", Dec('7874.0000')), ("Cake", None)])
+        self.assertEqual(prices[1][1], convert_price(Dec('100.00'), Currency.USD, Currency.EUR, SystemUnit.KG, SystemUnit.KG))
+        fetch.assert_not_called()
+
+        # And they can be filtered in the database
+        cheap_products = Product.objects.annotate_converted_price(Currency.USD, SystemUnit.KG).filter(converted_price__lt=100)
+        self.assertEqual(list(cheap_products.values_list('name', 'converted_price')), [("Flour", Dec('2.3529'))])
+
+    def test_05_annotate_converted_price_with_stale_rate(self, fetch):
+        _print_object(print_function_name=True)
+        # Given a USD rate stored more than 24 hours ago
+        with freeze_time(timezone.now() - timedelta(hours=25)):
+            ExchangeRate.objects.create(currency=Currency.USD, rate=Dec('0.800000'))
+
+        # When the products are annotated with their price in EUR
+        products = Product.objects.annotate_converted_price(Currency.EUR)
+
+        # Then the stale rate is not used: the price of the USD product cannot be converted by the database
+        self.assertEqual(list(products.values_list('name', 'converted_price')), [("Potatoes", None)])
+
+    def test_06_invalid_targets(self, fetch):
+        _print_object(print_function_name=True)
+        # Given a product without price
+        free_sample = Product.objects.create(name="Free sample", currency=Currency.EUR, system_unit=SystemUnit.KG)
+
+        # When it is converted to an unknown currency or unit, then a ValidationError is raised, as for a product with a price
+        for product in (free_sample, self.potatoes):
+            with self.assertRaises(ValidationError):
+                product.convert_price('XXX')
+            with self.assertRaises(ValidationError):
+                product.convert_price(Currency.EUR, 'portion')
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_07_converted_price_too_large(self, fetch):
+        _print_object(print_function_name=True)
+        # Given a product whose price per kg does not fit in price_excluding_tax (15 digits, 4 decimals)
+        Product.objects.create(name="Saffron", price_excluding_tax=Dec('10000000000.00'), currency=Currency.EUR, system_unit=SystemUnit.GRAM)
+
+        # When the products are converted in bulk, then a ValidationError is raised, and nothing is created
+        with self.assertRaises(ValidationError):
+            Product.objects.all().convert_price(Currency.EUR, SystemUnit.KG)
+        self.assertEqual(Product.objects.count(), 2)
+
+        # And the prices which fit are stored with 4 decimals
+        converted = Product.objects.filter(name="Potatoes").convert_price(Currency.EUR, SystemUnit.GRAM)
+        self.assertEqual(converted[0].price_excluding_tax, Dec('0.0850'))